@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import support  # noqa: E402
+from support import main, make_plugin, close_plugin, run_command, seed_images  # noqa: E402,F401
+
+
+@contextmanager
+def temp_plugin(config=None):
+    # 在临时目录中使用随插件附带的 data.db 构造插件，结束后关闭并清理
+    with tempfile.TemporaryDirectory() as path:
+        plugin = make_plugin(path, config)
+        try:
+            yield plugin
+        finally:
+            close_plugin(plugin)
+
+
+def timeit(func, repeat=5, number=1):
+    # 返回最佳一轮的单次耗时（秒）
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - t) / number)
+    return best
@@ -0,0 +1,30 @@
+# 随插件附带的 data/data.db 加载到内存后常驻的目录大小（tracemalloc）：每物品一个 dict vs 紧凑数组目录
+import gc
+import tracemalloc
+
+from _common import main, temp_plugin
+from test_catalog import legacy_load_catalog
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak
+
+
+def main_bench():
+    with temp_plugin() as plugin:
+        legacy, legacy_size, legacy_peak = retained(lambda: legacy_load_catalog(main.DB_FILE))
+        catalog, size, peak = retained(lambda: plugin._build_catalog(*plugin.db.load_all_data()))
+        items = sum(len(v) for v in legacy[0].values())
+        print(f"{len(legacy[0])} 个容器，{items} 个物品")
+        for label, s, p in (("每物品一个 dict（原实现）", legacy_size, legacy_peak), ("紧凑数组目录", size, peak)):
+            print(f"{label:<16} 常驻 {s / 1024:8.1f} KiB  加载峰值 {p / 1024:8.1f} KiB  {s / items:6.1f} 字节/物品")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,101 @@
+# 并发压力测试：每次调用新建连接 + 回滚日志（原实现）vs 长连接写入 + 读连接池 + WAL
+# 两种方式执行完全相同的 SQL（record_open_batch / get_user_stats），只替换连接层
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from _common import main, support
+
+THREADS = 16
+OPS_PER_THREAD = 60
+BATCH = 20
+
+
+class LegacyDatabaseManager(main.DatabaseManager):
+    # 原连接层：每次读写都 sqlite3.connect，默认 5 秒忙等待，rollback journal
+    def __init__(self, path):
+        self.db_path = path
+        self._user_versions = {}
+        self._closed = False
+        self._init_db()
+
+    @contextmanager
+    def _write(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn.cursor()
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+def run(db, sampler, label):
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(tid):
+        rnd = random.Random(tid)
+        for op in range(OPS_PER_THREAD):
+            user_key = f"g-{rnd.randrange(8)}"
+            t = time.perf_counter()
+            try:
+                if op % 2:
+                    db.record_open_batch(user_key, sampler.draw_batch, BATCH, f"p{tid}-{op}", 0, "now")
+                else:
+                    db.get_user_stats(user_key)
+            except sqlite3.OperationalError as e:
+                with lock: errors.append(str(e))
+            with lock: latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    t = time.perf_counter()
+    for th in threads: th.start()
+    for th in threads: th.join()
+    wall = time.perf_counter() - t
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e3
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e3
+    print(f"{label:<26} 吞吐 {len(latencies) / wall:8.0f} 次/秒  p50 {p50:7.2f} ms  p99 {p99:8.2f} ms  锁错误 {len(errors)}")
+
+
+def main_bench():
+    with tempfile.TemporaryDirectory() as path:
+        plugin = support.make_plugin(path)
+        try:
+            case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+            sampler = plugin.samplers[case_name]
+
+            legacy_path = os.path.join(path, "legacy.db")
+            shutil.copy(support.SHIPPED_DB, legacy_path)
+            conn = sqlite3.connect(legacy_path)
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+
+            print(f"{THREADS} 个线程，每线程 {OPS_PER_THREAD} 次操作（读写各半，每次写入 {BATCH} 连开）")
+            run(LegacyDatabaseManager(legacy_path), sampler, "每次新建连接（原实现）")
+            run(plugin.db, sampler, "长连接 + 连接池 + WAL")
+        finally:
+            support.close_plugin(plugin)
+
+
+if __name__ == "__main__":
+    main_bench()
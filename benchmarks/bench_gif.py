@@ -0,0 +1,104 @@
+# 单个开箱 GIF 的渲染耗时与输出大小：原逐帧 RGBA 合成 + 逐帧量化 vs 静态图层复用 + 帧合并 + 共享调色板
+import random
+
+from _common import main, temp_plugin, timeit, seed_images
+
+Image, ImageDraw = None, None
+
+
+def legacy_create_gif(gen, items_data, images):
+    # 优化前的 _create_optimized_gif：每帧新建 RGBA 画布、重绘指针层，结尾重复追加 20 帧
+    unit_w = gen.BASE_ITEM_SIZE + gen.MARGIN
+    total_width = len(items_data) * unit_w
+    strip_img = Image.new("RGBA", (total_width, gen.VIEWPORT_H), (0, 0, 0, 0))
+    strip_draw = ImageDraw.Draw(strip_img)
+    for idx, (item_data, img) in enumerate(zip(items_data, images)):
+        x = idx * unit_w
+        q_color = main.QUALITY_COLORS.get(item_data.get("rln"), (100, 100, 100))
+        draw_y = (gen.VIEWPORT_H - gen.BASE_ITEM_SIZE) // 2 - 20
+        strip_draw.rectangle([x, draw_y + gen.BASE_ITEM_SIZE, x + gen.BASE_ITEM_SIZE, draw_y + gen.BASE_ITEM_SIZE + 6], fill=q_color)
+        if img:
+            i_copy = img.copy()
+            i_copy.thumbnail((gen.BASE_ITEM_SIZE, gen.BASE_ITEM_SIZE), Image.Resampling.BICUBIC)
+            strip_img.paste(i_copy, (x, draw_y), i_copy)
+
+    frames = []
+    scroll_frames = int(gen.FPS * gen.SCROLL_DURATION)
+    outro_frames = 20
+    real_winner = gen.WINNER_INDEX + gen.HEAD_BUFFER
+    viewport_center_x = gen.VIEWPORT_W / 2
+    target_scroll_x = real_winner * unit_w + unit_w / 2 - viewport_center_x
+    target_scroll_x += random.uniform(-0.4, 0.4) * gen.BASE_ITEM_SIZE
+    start_scroll_x = (gen.HEAD_BUFFER * unit_w) - viewport_center_x
+
+    for f in range(scroll_frames + outro_frames):
+        frame = Image.new("RGBA", (gen.VIEWPORT_W, gen.VIEWPORT_H), (30, 30, 35, 255))
+        draw = ImageDraw.Draw(frame)
+        if f < scroll_frames:
+            t = f / scroll_frames
+            crop_x = int(start_scroll_x + (target_scroll_x - start_scroll_x) * (1 - pow(1 - t, 3)))
+            crop_x = max(0, min(crop_x, strip_img.width - gen.VIEWPORT_W))
+            viewport_slice = strip_img.crop((crop_x, 0, crop_x + gen.VIEWPORT_W, gen.VIEWPORT_H))
+            frame.paste(viewport_slice, (0, 0), viewport_slice)
+            draw.rectangle([0, 0, 50, gen.VIEWPORT_H], fill=(20, 20, 20, 100))
+            draw.rectangle([gen.VIEWPORT_W - 50, 0, gen.VIEWPORT_W, gen.VIEWPORT_H], fill=(20, 20, 20, 100))
+            mid = gen.VIEWPORT_W // 2
+            draw.line([(mid, 15), (mid, gen.VIEWPORT_H - 15)], fill=(255, 215, 0, 200), width=3)
+            draw.polygon([(mid - 8, 15), (mid + 8, 15), (mid, 30)], fill=(255, 215, 0, 255))
+            draw.polygon([(mid - 8, gen.VIEWPORT_H - 15), (mid + 8, gen.VIEWPORT_H - 15), (mid, gen.VIEWPORT_H - 30)], fill=(255, 215, 0, 255))
+        else:
+            scale = 1.0 + 0.3 * (f - scroll_frames) / outro_frames
+            item_data, img = items_data[real_winner], images[real_winner]
+            q_color = main.QUALITY_COLORS.get(item_data.get("rln"), (100, 100, 100))
+            draw_w = draw_h = int(gen.BASE_ITEM_SIZE * scale)
+            draw_x = (gen.VIEWPORT_W - draw_w) // 2
+            draw_y = (gen.VIEWPORT_H - draw_h) // 2 - 20
+            bar_h = 6 * scale
+            draw.rectangle([draw_x, draw_y + draw_h, draw_x + draw_w, draw_y + draw_h + bar_h], fill=q_color)
+            if img:
+                i_zoom = img.copy()
+                i_zoom.thumbnail((draw_w, draw_h), Image.Resampling.BICUBIC)
+                frame.paste(i_zoom, (int(draw_x), int(draw_y)), i_zoom)
+            short_name = item_data.get("name", "???").split("|")[-1].strip()
+            text_bbox = draw.textbbox((0, 0), short_name, font=gen.font_bold)
+            draw.text(((gen.VIEWPORT_W - (text_bbox[2] - text_bbox[0])) // 2, draw_y + draw_h + bar_h + 10),
+                      short_name, fill=q_color, font=gen.font_bold)
+        frames.append(frame.convert("RGB"))
+
+    frames += [frames[-1]] * 20
+    output = main.BytesIO()
+    frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:], duration=int(1000 / gen.FPS), loop=0, optimize=True)
+    return output.getvalue()
+
+
+def main_bench():
+    global Image, ImageDraw
+    with temp_plugin() as plugin:
+        main._load_pil()
+        Image, ImageDraw = main.Image, main.ImageDraw
+        gen, img_mgr = plugin.gif_gen, plugin.img_mgr
+        gen._ensure_fonts()
+        case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+        items = plugin.case_data[case_name]
+        seed_images(i.get("img") for i in items)
+
+        random.seed(3)
+        winner = plugin._generate_item(case_name)
+        scroll_items = [random.choice(items) for _ in range(gen.TOTAL_ITEMS + gen.HEAD_BUFFER)]
+        scroll_items[gen.WINNER_INDEX + gen.HEAD_BUFFER] = winner
+        strip_size = (gen.BASE_ITEM_SIZE, gen.BASE_ITEM_SIZE)
+        originals = [img_mgr.get_cached_image(img_mgr._get_file_path(i["img"])) for i in scroll_items]
+        thumbs = [img_mgr.get_thumbnail_sync(i["img"], strip_size) for i in scroll_items]
+        outro = img_mgr.get_thumbnail_sync(winner["img"], gen._outro_size())
+
+        print(f"容器: {case_name}（{len(items)} 件物品）")
+        for label, render in (("原实现", lambda: legacy_create_gif(gen, scroll_items, originals)),
+                              ("当前实现", lambda: gen._create_optimized_gif(scroll_items, thumbs, outro))):
+            data = render()
+            frames = Image.open(main.BytesIO(data)).n_frames
+            elapsed = timeit(render, repeat=3)
+            print(f"{label:<8} {elapsed * 1e3:8.1f} ms/GIF  {len(data) / 1024:8.1f} KiB  {frames:4d} 帧")
+
+
+if __name__ == "__main__":
+    main_bench()
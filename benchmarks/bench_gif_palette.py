@@ -0,0 +1,44 @@
+# GIF 编码阶段的耗时与大小：逐帧 RGB 量化（optimize=True，原实现）vs 共享全局调色板的索引帧
+# 两种方式编码同一组帧（取自当前渲染器对真实容器的输出）；滚动帧本身是索引滚动条的裁剪，不计映射开销
+import random
+
+from _common import main, temp_plugin, timeit, seed_images
+
+
+def encode(frames, durations, **kw):
+    output = main.BytesIO()
+    frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:], duration=durations, loop=0, **kw)
+    return output.getvalue()
+
+
+def main_bench():
+    with temp_plugin() as plugin:
+        main._load_pil()
+        Image = main.Image
+        case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+        items = plugin.case_data[case_name]
+        seed_images(i.get("img") for i in items)
+        random.seed(3)
+        winner = plugin._generate_item(case_name)
+        data = main.asyncio.run(plugin.gif_gen.generate(winner, items))
+
+        gif = Image.open(main.BytesIO(data))
+        palette_img = Image.new("P", (1, 1))
+        palette_img.putpalette(gif.getpalette())
+        rgb_frames, durations = [], []
+        for i in range(gif.n_frames):
+            gif.seek(i)
+            rgb_frames.append(gif.convert("RGB"))
+            durations.append(gif.info["duration"])
+        indexed = [f.quantize(palette=palette_img, dither=Image.Dither.NONE) for f in rgb_frames]
+        palette = palette_img.getpalette()
+
+        print(f"容器: {case_name}，{len(rgb_frames)} 帧")
+        for label, run in (("逐帧量化（原实现）", lambda: encode(rgb_frames, durations, optimize=True)),
+                           ("共享全局调色板", lambda: encode(indexed, durations, optimize=False, palette=palette))):
+            out = run()
+            print(f"{label:<14} {timeit(run, repeat=3) * 1e3:8.1f} ms  {len(out) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,55 @@
+# 10 个稀有物品的库存卡片生成耗时（模拟每张图片 100ms 的下载延迟）：
+# 冷启动（需下载全部图片）、磁盘缓存命中（新插件实例）、内存缓存命中
+import asyncio
+import tempfile
+import time
+
+from _common import make_plugin, close_plugin
+from test_inventory_card import fake_image_requests, rare_stats
+
+DELAY = 0.1
+REPEAT = 5
+
+
+def card_time(plugin, data):
+    async def go():
+        t = time.perf_counter()
+        await plugin.gif_gen.generate_inventory_card(data, plugin.item_img_map)
+        return time.perf_counter() - t
+    return asyncio.run(go())
+
+
+def main_bench():
+    rows = []
+    cold = []
+    for _ in range(REPEAT):
+        with tempfile.TemporaryDirectory() as path:
+            plugin = make_plugin(path)
+            stats = fake_image_requests(plugin, DELAY)
+            cold.append(card_time(plugin, rare_stats(plugin)))
+            requests = stats["requests"]
+            close_plugin(plugin)
+    rows.append((f"冷启动（{requests} 次下载）", min(cold)))
+
+    with tempfile.TemporaryDirectory() as path:
+        plugin = make_plugin(path)
+        fake_image_requests(plugin, DELAY)
+        card_time(plugin, rare_stats(plugin))
+        close_plugin(plugin)
+
+        disk = []
+        for _ in range(REPEAT):
+            plugin = make_plugin(path)
+            disk.append(card_time(plugin, rare_stats(plugin)))
+            memory = min(card_time(plugin, rare_stats(plugin)) for _ in range(REPEAT))
+            close_plugin(plugin)
+        rows.append(("磁盘缓存命中", min(disk)))
+        rows.append(("内存缓存命中", memory))
+
+    print(f"模拟下载延迟 {DELAY * 1e3:.0f} ms/张，逐张串行下载的下限为 {10 * DELAY * 1e3:.0f} ms")
+    for label, sec in rows:
+        print(f"{label:<16} {sec * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main_bench()
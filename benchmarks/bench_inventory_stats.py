@@ -0,0 +1,72 @@
+# 库存统计：原实现（每次对 history 做 GROUP BY）vs 增量聚合表 + (user_key, id) 复合索引
+# 使用一个有 10 万条稀有掉落记录的用户
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+
+from _common import support, timeit
+
+ROWS = 100_000
+USER = "heavy"
+
+
+def legacy_get_user_stats(conn, user_key):
+    # 原 DatabaseManager.get_user_stats 的查询
+    c = conn.cursor()
+    c.execute("SELECT quality, count FROM user_stats WHERE user_key=?", (user_key,))
+    stats = dict(c.fetchall())
+    c.execute("SELECT quality, count(*) FROM history WHERE user_key=? GROUP BY quality", (user_key,))
+    for q, count in c.fetchall():
+        stats[q] = stats.get(q, 0) + count
+    total = sum(stats.values())
+    c.execute("""SELECT name, quality, wear_value, img_url FROM history WHERE user_key=?
+                 AND (quality IN ('隐秘', '非凡', 'Contraband') OR is_special=1) ORDER BY id DESC LIMIT 10""", (user_key,))
+    return {"total": total, "other_stats": stats, "items": c.fetchall()}
+
+
+def seed_history(conn):
+    rnd = random.Random(1)
+    rows = [(USER if i % 4 == 0 else f"other{i % 50}", f"item{i}", rnd.choice(["隐秘", "非凡"]), rnd.random(), 1, "")
+            for i in range(ROWS * 4)]
+    conn.executemany("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("INSERT OR REPLACE INTO user_stats (user_key, quality, count) VALUES (?, '军规级', 500000)", (USER,))
+    conn.commit()
+
+
+def main_bench():
+    with tempfile.TemporaryDirectory() as path:
+        # 原实现的数据库：只有 user_key 单列索引，没有聚合表
+        legacy_path = os.path.join(path, "legacy.db")
+        shutil.copy(support.SHIPPED_DB, legacy_path)
+        legacy = sqlite3.connect(legacy_path)
+        legacy.execute("DROP INDEX IF EXISTS idx_history_user_id")
+        legacy.execute("CREATE INDEX IF NOT EXISTS idx_user_key ON history (user_key)")
+        seed_history(legacy)
+
+        support.isolate_data_dir(path)
+        conn = sqlite3.connect(support.main.DB_FILE)
+        conn.executescript("""CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, user_key TEXT NOT NULL,
+                              name TEXT, quality TEXT, wear_value REAL, is_special INTEGER, img_url TEXT,
+                              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+                              CREATE TABLE IF NOT EXISTS user_stats (user_key TEXT NOT NULL, quality TEXT NOT NULL,
+                              count INTEGER DEFAULT 0, PRIMARY KEY (user_key, quality));""")
+        seed_history(conn)
+        conn.close()
+        # 新数据库首次打开时从 history 重建聚合表
+        db = support.main.DatabaseManager()
+        try:
+            assert legacy_get_user_stats(legacy, USER)["total"] == db.get_user_stats(USER)["total"]
+            print(f"用户 {USER}: {ROWS:,} 条稀有记录（表中共 {ROWS * 4:,} 条）")
+            for label, fn in (("原实现 get_user_stats", lambda: legacy_get_user_stats(legacy, USER)),
+                              ("聚合表 get_user_stats", lambda: db.get_user_stats(USER)),
+                              ("聚合表 get_user_total (总库存)", lambda: db.get_user_total(USER))):
+                print(f"{label:<28} {timeit(fn, repeat=5, number=20) * 1e3:9.3f} ms")
+        finally:
+            db.close()
+            legacy.close()
+
+
+if __name__ == "__main__":
+    main_bench()
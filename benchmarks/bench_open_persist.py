@@ -0,0 +1,44 @@
+# 一次 50 连开的持久化开销：逐个 add_item（原实现）vs record_open_batch 单事务
+import random
+import time
+
+from _common import temp_plugin
+
+N = 50
+REQUESTS = 40
+
+
+def bench(plugin, label, persist):
+    statements = []
+    plugin.db._writer.set_trace_callback(statements.append)
+    t = time.perf_counter()
+    for r in range(REQUESTS):
+        persist(f"bench-{label}", r)
+    elapsed = (time.perf_counter() - t) / REQUESTS
+    plugin.db._writer.set_trace_callback(None)
+    commits = sum(1 for s in statements if s.strip().upper() == "COMMIT") / REQUESTS
+    print(f"{label:<28} {elapsed * 1e3:8.2f} ms/请求  {commits:6.1f} 次提交/请求")
+
+
+def main_bench():
+    with temp_plugin() as plugin:
+        case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+        sampler = plugin.samplers[case_name]
+        db = plugin.db
+        random.seed(1)
+
+        def per_item(user_key, r):
+            db.consume_daily_quota(user_key, f"p{r}", N, 0, "now")
+            for item in sampler.draw_batch(N):
+                db.add_item(user_key, item)
+
+        def batched(user_key, r):
+            db.record_open_batch(user_key, sampler.draw_batch, N, f"p{r}", 0, "now")
+
+        print(f"容器: {case_name}，每请求 {N} 连开，共 {REQUESTS} 次请求")
+        bench(plugin, "逐个 add_item（原实现）", per_item)
+        bench(plugin, "record_open_batch", batched)
+
+
+if __name__ == "__main__":
+    main_bench()
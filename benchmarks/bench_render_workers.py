@@ -0,0 +1,53 @@
+# 多群同时开箱时的 GIF 吞吐与事件循环最大卡顿：线程渲染（render_workers=0）vs 1/2/4 个渲染进程
+import asyncio
+import os
+import time
+
+from _common import temp_plugin, seed_images
+
+CONCURRENT = 8
+ROUNDS = 3
+
+
+async def run_round(plugin, case_name, items):
+    # 渲染期间每 5ms 唤醒一次的探针记录事件循环的最大延迟，反映其他消息被阻塞的时长
+    winners = [plugin._generate_item(case_name) for _ in range(CONCURRENT)]
+    lag, done = [0.0], asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag[0] = max(lag[0], time.perf_counter() - t - 0.005)
+
+    probe_task = asyncio.ensure_future(probe())
+    t = time.perf_counter()
+    await asyncio.gather(*(plugin.gif_gen.generate(w, items) for w in winners))
+    elapsed = time.perf_counter() - t
+    done.set()
+    await probe_task
+    return elapsed, lag[0]
+
+
+def bench(workers):
+    with temp_plugin({"render_workers": workers}) as plugin:
+        case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+        items = plugin.case_data[case_name]
+        seed_images(i.get("img") for i in items)
+
+        async def go():
+            # 第一轮用于预热进程池与派生缩略图缓存，不计入结果
+            await run_round(plugin, case_name, items)
+            return [await run_round(plugin, case_name, items) for _ in range(ROUNDS)]
+
+        results = asyncio.run(go())
+    best = min(r[0] for r in results)
+    lag = max(r[1] for r in results)
+    label = "线程渲染" if workers == 0 else f"{workers} 个渲染进程"
+    print(f"{label:<12} {CONCURRENT / best:6.2f} GIF/s  {best / CONCURRENT * 1e3:8.1f} ms/GIF  事件循环最大卡顿 {lag * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    print(f"CPU 核心数: {os.cpu_count()}，每轮 {CONCURRENT} 个并发开箱")
+    for workers in (0, 1, 2, 4):
+        bench(workers)
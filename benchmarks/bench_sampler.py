@@ -0,0 +1,28 @@
+# 对比原逐项累加实现与预计算抽样表的每秒抽取次数
+import random
+
+from _common import temp_plugin, timeit
+from test_sampler import legacy_generate_item
+
+N = 20_000
+
+
+def main_bench():
+    with temp_plugin() as plugin:
+        case_name = max((n for n in plugin.case_data if plugin.samplers.get(n)), key=lambda n: len(plugin.case_data[n]))
+        sampler = plugin.samplers[case_name]
+        random.seed(1)
+        legacy = timeit(lambda: [legacy_generate_item(plugin, case_name) for _ in range(N)], repeat=3)
+        single = timeit(lambda: [plugin._generate_item(case_name) for _ in range(N)], repeat=3)
+        batch = timeit(lambda: sampler.draw_batch(N), repeat=3)
+        batch_dicts = timeit(lambda: list(sampler.draw_batch(N)), repeat=3)
+        print(f"容器: {case_name}（{len(plugin.case_data[case_name])} 个物品），每轮 {N} 次")
+        for label, sec in (("原实现 (逐项累加 + random.choices)", legacy),
+                           ("_generate_item (单次抽样)", single),
+                           ("draw_batch (紧凑结果)", batch),
+                           ("draw_batch + 转换为 dict", batch_dicts)):
+            print(f"{label:<36} {N / sec:>12,.0f} 次/秒  ({legacy / sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main_bench()
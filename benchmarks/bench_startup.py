@@ -0,0 +1,50 @@
+# 插件启动耗时（导入 main + CasePlugin.__init__），每次在新的解释器中测量：
+# 冷启动（无目录快照，从数据库构建）vs 热启动（读取目录快照）
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNS = 5
+
+
+def child(path):
+    t = time.perf_counter()
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+    import support
+    t_import = time.perf_counter() - t
+    t = time.perf_counter()
+    plugin = support.make_plugin(path)
+    t_init = time.perf_counter() - t
+    pil_loaded = support.main.Image is not None
+    support.close_plugin(plugin)
+    print(f"{t_import:.6f} {t_init:.6f} {int(pil_loaded)}")
+
+
+def run(path, cold):
+    if cold:
+        snapshot = os.path.join(path, "data", "catalog.pickle")
+        if os.path.exists(snapshot): os.remove(snapshot)
+    out = subprocess.run([sys.executable, __file__, "--child", path], capture_output=True, text=True, check=True).stdout
+    t_import, t_init, pil = out.strip().splitlines()[-1].split()
+    return float(t_import), float(t_init), pil == "1"
+
+
+def main_bench():
+    with tempfile.TemporaryDirectory() as path:
+        run(path, cold=True)
+        for label, cold in (("冷启动（无快照）", True), ("热启动（读取快照）", False)):
+            results = [run(path, cold) for _ in range(RUNS)]
+            t_import = min(r[0] for r in results)
+            t_init = min(r[1] for r in results)
+            pil = "是" if any(r[2] for r in results) else "否"
+            print(f"{label:<12} 导入 {t_import * 1e3:7.1f} ms  __init__ {t_init * 1e3:7.1f} ms  "
+                  f"合计 {(t_import + t_init) * 1e3:7.1f} ms  启动时加载 Pillow: {pil}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        main_bench()
@@ -6,12 +6,22 @@ import time
 import asyncio
 import hashlib
 import math
-import urllib.request
-import ssl
+import uuid
+import pickle
 import shutil
 import sqlite3
+import threading
+import queue
+import bisect
+from array import array
 from io import BytesIO
-from functools import lru_cache
+from itertools import accumulate
+from functools import partial
+from collections import OrderedDict
+from collections.abc import Mapping
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import quote
 from datetime import datetime, timedelta
 
@@ -20,31 +30,50 @@ import astrbot.api.message_components as Comp
 from astrbot.api.all import *
 from astrbot.api.star import StarTools  
 
-# === 引入图像处理库 ===
-try:
-    from PIL import Image, ImageDraw, ImageFont, ImageFilter
-except ImportError:
-    raise ImportError("请先安装 Pillow 库: pip install Pillow")
+# === 引入异步 HTTP 库（AstrBot 自带依赖） ===
+import aiohttp
+
+# === 图像处理库（Pillow）在首次渲染或读写图片时才导入，加快插件加载 ===
+Image = ImageDraw = ImageFont = ImageFilter = None
+_PIL_LOCK = threading.Lock()
+
+def _load_pil():
+    global Image, ImageDraw, ImageFont, ImageFilter
+    if ImageFilter is not None: return
+    with _PIL_LOCK:
+        if ImageFilter is not None: return
+        try:
+            from PIL import Image, ImageDraw, ImageFont, ImageFilter
+        except ImportError:
+            raise ImportError("请先安装 Pillow 库: pip install Pillow")
 
 # ================= 目录结构配置 =================
 PLUGIN_ROOT = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(PLUGIN_ROOT, 'data')
 IMAGES_DIR = os.path.join(DATA_DIR, 'images')
+SPOOL_DIR = os.path.join(DATA_DIR, 'spool')
 DB_FILE = os.path.join(DATA_DIR, 'data.db')
 
 # ================= 目录结构与自动字体配置 =================
 FONT_DIR = os.path.join(PLUGIN_ROOT, 'font')
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(IMAGES_DIR, exist_ok=True)
-os.makedirs(FONT_DIR, exist_ok=True) # 确保 font 目录存在
-
-# 自动搜索 font 目录下的可用字体文件
-FONT_PATH = None
-for file_name in os.listdir(FONT_DIR):
-    # 支持常见的字体后缀
-    if file_name.lower().endswith(('.ttf', '.ttc', '.otf')):
-        FONT_PATH = os.path.join(FONT_DIR, file_name)
-        break # 找到第一个就停止
+CATALOG_SNAPSHOT_FILE = os.path.join(DATA_DIR, 'catalog.pickle')
+
+def _ensure_dirs():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    os.makedirs(FONT_DIR, exist_ok=True) # 确保 font 目录存在
+
+def _find_font_path():
+    # 自动搜索 font 目录下的可用字体文件
+    try:
+        for file_name in sorted(os.listdir(FONT_DIR)):
+            # 支持常见的字体后缀
+            if file_name.lower().endswith(('.ttf', '.ttc', '.otf')):
+                return os.path.join(FONT_DIR, file_name) # 找到第一个就停止
+    except Exception:
+        pass
+    return None
 
 OLD_HISTORY_FILE = os.path.join(PLUGIN_ROOT, 'open_history.json')
 OLD_HISTORY_FILE_IN_DATA = os.path.join(DATA_DIR, 'open_history.json')
@@ -83,8 +112,35 @@ PROB_CATEGORY_15 = {"军规级": 0.80128, "受限": 0.16026, "保密": 0.03205,
 NORMAL_DOPPLER_PROBS = {"p1": 0.2, "p2": 0.2, "p3": 0.2, "p4": 0.2, "蓝宝石": 0.1, "红宝石": 0.05, "黑珍珠": 0.05}
 GAMMA_DOPPLER_PROBS = {"p1": 0.2, "p2": 0.2, "p3": 0.2, "p4": 0.2, "绿宝石": 0.2}
 
+# 预计算累积权重，抽取时直接二分查找，避免每次开箱重建权重列表
+WEAR_CUM_WEIGHTS = list(accumulate(wl[1] for wl in WEAR_LEVELS))
+DOPPLER_WEAR_CUM_WEIGHTS = list(accumulate(wl[1] for wl in DOPPLER_WEAR_LEVELS))
+NORMAL_DOPPLER_TYPES = list(NORMAL_DOPPLER_PROBS.keys())
+NORMAL_DOPPLER_CUM_WEIGHTS = list(accumulate(NORMAL_DOPPLER_PROBS.values()))
+GAMMA_DOPPLER_TYPES = list(GAMMA_DOPPLER_PROBS.keys())
+GAMMA_DOPPLER_CUM_WEIGHTS = list(accumulate(GAMMA_DOPPLER_PROBS.values()))
+
+RARE_QUALITIES = ("隐秘", "非凡", "Contraband")
+
 ALL_QUALITIES = set().union(*[p.keys() for p in [PROB_CATEGORY_1, PROB_CATEGORY_2, PROB_CATEGORY_3, PROB_CATEGORY_4, PROB_CATEGORY_5, PROB_CATEGORY_6, PROB_CATEGORY_15]])
 
+# 容器常用简称 / 英文名 -> 完整名称。目标不在当前目录中的别名会被忽略，
+# 也可以通过配置项 case_aliases 追加
+CASE_ALIASES = {
+    "cs20": "反恐精英20周年武器箱", "20周年": "反恐精英20周年武器箱",
+    "recoil": "反冲武器箱", "revolution": "变革武器箱", "kilowatt": "千瓦武器箱",
+    "gallery": "画廊武器箱", "fever": "热潮武器箱", "dreams": "梦魇武器箱",
+    "clutch": "命悬一线武器箱", "fracture": "裂空武器箱", "snakebite": "蛇噬武器箱",
+    "prisma": "棱彩武器箱", "prisma2": "棱彩2号武器箱", "spectrum": "光谱武器箱", "spectrum2": "光谱 2 号武器箱",
+    "gamma": "伽玛武器箱", "gamma2": "伽玛 2 号武器箱", "chroma": "幻彩武器箱", "chroma2": "幻彩 2 号武器箱", "chroma3": "幻彩 3 号武器箱",
+    "glove": "手套武器箱", "horizon": "地平线武器箱", "dangerzone": "“头号特训”武器箱", "头号": "“头号特训”武器箱",
+    "shadow": "暗影武器箱", "falchion": "弯曲猎手武器箱", "huntsman": "猎杀者武器箱", "revolver": "左轮武器箱",
+    "wildfire": "“野火大行动”武器箱", "breakout": "“突围大行动”武器箱", "vanguard": "“先锋大行动”武器箱",
+    "phoenix": "“凤凰大行动”武器箱", "bravo": "“英勇大行动”武器箱", "hydra": "“九头蛇大行动”武器箱",
+    "riptide": "“激流大行动”武器箱", "brokenfang": "“狂牙大行动”武器箱", "shatteredweb": "“裂网大行动”武器箱",
+    "winteroffensive": "冬季攻势武器箱", "冬季": "冬季攻势武器箱",
+}
+
 def get_wear_name(wear_value):
     if wear_value < 0.07: return "崭新出厂"
     if wear_value < 0.15: return "略有磨损"
@@ -92,10 +148,445 @@ def get_wear_name(wear_value):
     if wear_value < 0.45: return "破损不堪"
     return "战痕累累"
 
+# ================= 辅助类：掉落抽样 =================
+# 单个容器的掉落抽样表：概率为 0 的物品不参与抽取，累积权重与物品下标存放在 Catalog 的共享数组中，
+# 这里只记录本容器的区间 [lo, hi)，开箱时在区间内二分查找 O(log n)
+class CaseSampler:
+    __slots__ = ("catalog", "case_name", "ctype", "lo", "hi")
+
+    def __init__(self, catalog, case_name, ctype, lo, hi):
+        self.catalog = catalog
+        self.case_name = case_name
+        self.ctype = ctype
+        self.lo = lo
+        self.hi = hi
+
+    def __bool__(self):
+        return self.hi > self.lo
+
+    def draw_item(self):
+        # 与原累积概率循环等价：取第一个累积值 >= rand 的物品，越界时落到最后一个
+        pos = bisect.bisect_left(self.catalog.draw_cum, random.random(), self.lo, self.hi)
+        return CatalogItem(self.catalog, self.catalog.draw_idx[min(pos, self.hi - 1)])
+
+    def draw_batch(self, n):
+        rand = random.random
+        catalog = self.catalog
+        cum, draw_idx, flags = catalog.draw_cum, catalog.draw_idx, catalog.item_flags
+        lo, hi, last = self.lo, self.hi, self.hi - 1
+        bisect_left = bisect.bisect_left
+        # item_idx 存放物品在 Catalog 中的全局下标
+        item_idx = array("i", [draw_idx[min(bisect_left(cum, rand(), lo, hi), last)] for _ in range(n)])
+
+        stattrak = array("b", [bool(flags[i] & Catalog.FLAG_STATTRAK) and rand() < 0.1 for i in item_idx])
+
+        phase = array("b", [-1] * n)
+        wear_idx = array("b", [0] * n)
+        wear_values = array("d", [0.0] * n)
+        for row, i in enumerate(item_idx):
+            kind = flags[i] >> 1
+            if kind:
+                phase_cum = GAMMA_DOPPLER_CUM_WEIGHTS if kind == 2 else NORMAL_DOPPLER_CUM_WEIGHTS
+                phase[row] = bisect.bisect(phase_cum, rand() * phase_cum[-1])
+                levels, level_cum = DOPPLER_WEAR_LEVELS, DOPPLER_WEAR_CUM_WEIGHTS
+            else:
+                levels, level_cum = WEAR_LEVELS, WEAR_CUM_WEIGHTS
+            level = bisect.bisect(level_cum, rand() * level_cum[-1])
+            wear_idx[row] = level
+            lo, hi = levels[level][2], levels[level][3]
+            wear_values[row] = round(lo + (hi - lo) * rand(), 8)
+
+        template_ids = array("h", [random.randrange(1000) for _ in range(n)])
+        return OpenBatch(self, item_idx, stattrak, phase, wear_idx, wear_values, template_ids)
+
+    def quality(self, i):
+        return self.catalog.qualities[self.catalog.item_quality[i]]
+
+    def build_row(self, batch, row):
+        i = batch.item_idx[row]
+        catalog = self.catalog
+        raw_name = catalog.strings[catalog.item_name[i]]
+        quality = catalog.qualities[catalog.item_quality[i]]
+        item_name = raw_name
+
+        if self.ctype == "souvenir": item_name = f"纪念品 | {item_name}"
+        elif batch.stattrak[row]: item_name = f"StatTrak™ | {item_name}"
+
+        kind = catalog.item_flags[i] >> 1
+        if kind:
+            types = GAMMA_DOPPLER_TYPES if kind == 2 else NORMAL_DOPPLER_TYPES
+            item_name = item_name.replace("多普勒", f"多普勒 ({types[batch.phase[row]]})")
+        levels = DOPPLER_WEAR_LEVELS if kind else WEAR_LEVELS
+
+        return {
+            "name": item_name,
+            "raw_name": raw_name,
+            "quality": quality,
+            "wear_value": batch.wear_values[row],
+            "wear_level": levels[batch.wear_idx[row]][0],
+            "template_id": batch.template_ids[row],
+            "img": catalog.string(catalog.item_img[i]),
+            "is_special": quality in RARE_QUALITIES,
+            "rln": quality
+        }
+
+# 一次批量开箱的结果，按列存放在紧凑数组里，只有在需要展示时才转换成 dict
+class OpenBatch:
+    __slots__ = ("sampler", "item_idx", "stattrak", "phase", "wear_idx", "wear_values", "template_ids")
+
+    def __init__(self, sampler, item_idx, stattrak, phase, wear_idx, wear_values, template_ids):
+        self.sampler = sampler
+        self.item_idx = item_idx
+        self.stattrak = stattrak
+        self.phase = phase
+        self.wear_idx = wear_idx
+        self.wear_values = wear_values
+        self.template_ids = template_ids
+
+    def __len__(self):
+        return len(self.item_idx)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return OpenBatch(self.sampler, self.item_idx[key], self.stattrak[key], self.phase[key],
+                             self.wear_idx[key], self.wear_values[key], self.template_ids[key])
+        if key < 0: key += len(self)
+        if not 0 <= key < len(self): raise IndexError(key)
+        return self.sampler.build_row(self, key)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.sampler.build_row(self, row)
+
+    def quality(self, row):
+        return self.sampler.quality(self.item_idx[row])
+
+    def quality_counts(self):
+        codes = {}
+        item_quality = self.sampler.catalog.item_quality
+        for i in self.item_idx:
+            q = item_quality[i]
+            codes[q] = codes.get(q, 0) + 1
+        qualities = self.sampler.catalog.qualities
+        return {qualities[q]: n for q, n in codes.items()}
+
+    def rare_rows(self):
+        return [row for row in range(len(self)) if self.quality(row) in RARE_QUALITIES]
+
+# ================= 辅助类：限速 =================
+# 异步令牌桶：按 rate 次/秒补充令牌，最多积攒 burst 个；acquire 在令牌不足时非阻塞地等待
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# ================= 辅助类：容器名称索引 =================
+# 容器名模糊匹配：规范化名称、去后缀简称与别名都建立 1/2-gram 倒排索引，
+# 查询时取各 gram 倒排表的交集再校验子串，结果按匹配度确定性排序
+class CaseNameIndex:
+    SUFFIXES = ("武器箱", "收藏品", "收藏包", "纪念包", "探员", "包裹")
+
+    def __init__(self, names, aliases=None):
+        self._exact = {}
+        self._keys = []
+        self._grams = {}
+        for name in names:
+            norm = self.normalize(name)
+            self._add(norm, name)
+            for suffix in self.SUFFIXES:
+                if norm.endswith(suffix) and len(norm) > len(suffix):
+                    self._add(norm[:-len(suffix)], name)
+                    break
+        known = set(names)
+        for alias, name in (aliases or {}).items():
+            if name in known and self.normalize(alias): self._add(self.normalize(alias), name)
+
+    @staticmethod
+    def normalize(text):
+        return re.sub(r"[\s“”\"'「」|·\-_:：]+", "", text).lower()
+
+    def _add(self, key, name):
+        self._exact.setdefault(key, set()).add(name)
+        idx = len(self._keys)
+        self._keys.append((key, name))
+        for gram in set(key) | {key[i:i + 2] for i in range(len(key) - 1)}:
+            self._grams.setdefault(gram, set()).add(idx)
+
+    def lookup(self, query):
+        # 返回按匹配度排序的候选容器名；只有一个元素时即为唯一匹配
+        result = self._lookup(query)
+        tokens = query.split()
+        if result or len(tokens) < 2: return result
+        # 多个关键词（如“奥斯汀 核子”）时取各关键词匹配结果的交集
+        matched = set(self._lookup(tokens[0]))
+        for token in tokens[1:]:
+            matched &= set(self._lookup(token))
+        return sorted(matched, key=lambda n: (len(n), n))
+
+    def _lookup(self, query):
+        q = self.normalize(query)
+        if not q: return []
+        exact = self._exact.get(q)
+        if exact: return sorted(exact, key=lambda n: (len(n), n))
+        grams = {q[i:i + 2] for i in range(len(q) - 1)} or {q}
+        postings = sorted((self._grams.get(g, set()) for g in grams), key=len)
+        best = {}
+        for idx in postings[0].intersection(*postings[1:]):
+            key, name = self._keys[idx]
+            pos = key.find(q)
+            if pos < 0: continue
+            # 前缀匹配优先，其次关键词覆盖名称的比例越高越好
+            score = (pos != 0, -len(q) / len(key))
+            if name not in best or score < best[name]: best[name] = score
+        return sorted(best, key=lambda n: (best[n], len(n), n))
+
+# ================= 辅助类：内存目录 =================
+# 紧凑的只读内存目录：所有字符串（物品名、图片 URL）只在字符串表中存一份，
+# 物品属性按列存放在共享 array 中，每个容器只记录自己在数组中的下标区间。
+# 更新时构建新对象后整体替换引用，进行中的开箱始终持有同一份快照，不会读到写了一半的目录
+class Catalog:
+    FLAG_STATTRAK = 1
+
+    def __init__(self, entries, case_images, aliases=None):
+        # entries: [(容器名, [(short_name, rln, img), ...], [概率, ...], 容器类型), ...]
+        self.strings = []
+        string_ids = {}
+        self.qualities = []
+        quality_ids = {}
+
+        def sid(text):
+            if text is None: return -1
+            i = string_ids.get(text)
+            if i is None:
+                i = string_ids[text] = len(self.strings)
+                self.strings.append(text)
+            return i
+
+        self.case_images = dict(case_images)
+        self.container_names = []
+        self.container_types = []
+        self._container_ids = {}
+        self.ranges = array("i", [0])
+        self.item_name = array("i")
+        self.item_quality = array("b")
+        self.item_img = array("i")
+        self.item_prob = array("d")
+        self.item_flags = array("b")
+        # 抽样表：按容器连续存放概率大于 0 的物品下标及其容器内累积权重
+        self.draw_idx = array("i")
+        self.draw_cum = array("d")
+        self.samplers = {}
+        # 对应数据库中的 catalog_version，用于封面、容器列表等渲染缓存的失效判断
+        self.version = None
+
+        for name, rows, probs, ctype in entries:
+            self._container_ids[name] = len(self.container_names)
+            self.container_names.append(name)
+            self.container_types.append(ctype)
+            draw_lo, total = len(self.draw_idx), 0.0
+            for (short_name, rln, img), prob in zip(rows, probs):
+                idx = len(self.item_name)
+                q = quality_ids.get(rln)
+                if q is None:
+                    q = quality_ids[rln] = len(self.qualities)
+                    self.qualities.append(rln)
+                self.item_name.append(sid(short_name))
+                self.item_quality.append(q)
+                self.item_img.append(sid(img))
+                self.item_prob.append(prob)
+                # bit0: 可出 StatTrak；bit1-2: 多普勒类型（1 普通，2 伽玛）
+                flags = self.FLAG_STATTRAK if ctype == "case" and "手套" not in short_name else 0
+                if "多普勒" in short_name: flags |= (2 if "伽玛" in short_name else 1) << 1
+                self.item_flags.append(flags)
+                if prob > 0:
+                    total += prob
+                    self.draw_idx.append(idx)
+                    self.draw_cum.append(total)
+            self.ranges.append(len(self.item_name))
+            self.samplers[name] = CaseSampler(self, name, ctype, draw_lo, len(self.draw_idx))
+
+        # 物品名 -> 图片：同名物品取最后一个有图片的，按名称排序后二分查找
+        latest = {}
+        for idx, img in enumerate(self.item_img):
+            if img >= 0: latest[self.item_name[idx]] = idx
+        self.img_by_name = array("i", sorted(latest.values(), key=lambda i: self.strings[self.item_name[i]]))
+
+        self.case_data = CaseItemsView(self)
+        self.item_img_map = ItemImageView(self)
+        self.name_index = CaseNameIndex(self.container_names, aliases)
+
+    def string(self, sid):
+        return self.strings[sid] if sid >= 0 else None
+
+    def item_range(self, name):
+        cid = self._container_ids[name]
+        return self.ranges[cid], self.ranges[cid + 1]
+
+    def entry(self, name):
+        # 还原单个容器的构建参数，增量更新时复用未变化容器的概率
+        cid = self._container_ids[name]
+        lo, hi = self.ranges[cid], self.ranges[cid + 1]
+        rows = [(self.strings[self.item_name[i]], self.qualities[self.item_quality[i]], self.string(self.item_img[i]))
+                for i in range(lo, hi)]
+        return name, rows, list(self.item_prob[lo:hi]), self.container_types[cid]
+
+    # 快照格式版本：CaseSampler / Catalog / CaseNameIndex 的结构或概率表变化时需要递增
+    SNAPSHOT_FORMAT = 2
+
+    def save_snapshot(self, path, version, aliases):
+        data = {"format": self.SNAPSHOT_FORMAT, "version": version, "aliases": aliases, "catalog": self}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path, version, aliases):
+        # 快照缺失、损坏、格式或目录版本不一致时返回 None，由调用方从数据库重建
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(data, dict) or data.get("format") != cls.SNAPSHOT_FORMAT or data.get("version") != version:
+            return None
+        catalog = data["catalog"]
+        if data.get("aliases") != aliases:
+            catalog.name_index = CaseNameIndex(catalog.container_names, aliases)
+        catalog.version = version
+        return catalog
+
+# 目录中单个物品的只读视图，兼容原先 dict 的 item["short_name"] / item.get("img") 用法
+class CatalogItem:
+    __slots__ = ("catalog", "idx")
+
+    def __init__(self, catalog, idx):
+        self.catalog = catalog
+        self.idx = idx
+
+    def __getitem__(self, key):
+        c, i = self.catalog, self.idx
+        if key == "short_name": return c.strings[c.item_name[i]]
+        if key == "rln": return c.qualities[c.item_quality[i]]
+        if key == "img": return c.string(c.item_img[i])
+        if key == "probability": return c.item_prob[i]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+# 容器名 -> 物品视图列表，访问时才生成视图对象
+class CaseItemsView(Mapping):
+    __slots__ = ("catalog",)
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, name):
+        lo, hi = self.catalog.item_range(name)
+        return [CatalogItem(self.catalog, i) for i in range(lo, hi)]
+
+    def __contains__(self, name):
+        return name in self.catalog._container_ids
+
+    def __iter__(self):
+        return iter(self.catalog.container_names)
+
+    def __len__(self):
+        return len(self.catalog.container_names)
+
+# 物品名 -> 图片 URL，在按名称排序的下标数组上二分查找
+class ItemImageView(Mapping):
+    __slots__ = ("catalog",)
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def _name(self, idx):
+        return self.catalog.strings[self.catalog.item_name[idx]]
+
+    def __getitem__(self, name):
+        c = self.catalog
+        pos = bisect.bisect_left(c.img_by_name, name, key=self._name)
+        if pos < len(c.img_by_name) and self._name(c.img_by_name[pos]) == name:
+            return c.strings[c.item_img[c.img_by_name[pos]]]
+        raise KeyError(name)
+
+    def __iter__(self):
+        return (self._name(i) for i in self.catalog.img_by_name)
+
+    def __len__(self):
+        return len(self.catalog.img_by_name)
+
 # ================= 辅助类：网络请求 =================
+class HttpClient:
+    # 全插件共享的异步 HTTP 层：按主机复用 keep-alive 连接，超时可配置，失败时非阻塞地抖动退避重试
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, timeout: float = 20, connect_timeout: float = 10, max_retries: int = 3,
+                 backoff_base: float = 1.0, limit_per_host: int = 8):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.limit_per_host = limit_per_host
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host, ssl=False,
+                                             keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+            )
+        return self._session
+
+    async def request(self, url, method="GET", headers=None, data=None, timeout=None, max_retries=None):
+        if not url.startswith("http"): url = "https://" + url
+        retries = max_retries or self.max_retries
+        # 未指定 timeout 时不传该参数：显式传 None 会被 aiohttp 视为不限时，覆盖会话的默认超时
+        kw = {"timeout": aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)} if timeout else {}
+        for attempt in range(retries):
+            try:
+                async with self._get_session().request(method, url, headers=headers, data=data, **kw) as resp:
+                    if resp.status in self.RETRY_STATUS and attempt < retries - 1:
+                        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                    resp.raise_for_status()
+                    return await resp.read()
+            except aiohttp.ClientResponseError as e:
+                # 只有 RETRY_STATUS 中的状态码值得重试，404 等其他错误直接抛出
+                if e.status not in self.RETRY_STATUS or attempt == retries - 1: raise
+                await asyncio.sleep(self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.5))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries - 1: raise
+                await asyncio.sleep(self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
 class NetworkManager:
-    def __init__(self, api_token):
-        self.ssl_context = ssl._create_unverified_context()
+    def __init__(self, api_token, http: HttpClient):
+        self.http = http
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://buff.163.com/',
@@ -103,48 +594,338 @@ class NetworkManager:
             'ApiToken': api_token
         }
 
-    def request(self, url, method="GET", data=None, max_retries=3):
+    async def request(self, url, method="GET", data=None, max_retries=3):
         if data: data = data.encode('utf-8')
-        if not url.startswith("http"): url = "https://" + url
-        for attempt in range(max_retries):
-            try:
-                req = urllib.request.Request(url, data=data, headers=self.headers, method=method)
-                with urllib.request.urlopen(req, context=self.ssl_context, timeout=20) as response:
-                    return json.loads(response.read().decode('utf-8'))
-            except Exception as e:
-                if attempt == max_retries - 1: raise e
-                time.sleep(2)
+        body = await self.http.request(url, method=method, headers=self.headers, data=data, max_retries=max_retries)
+        return json.loads(body.decode('utf-8'))
 
 # ================= 辅助类：图片管理 =================
-class ImageManager:
-    def __init__(self, retention_days: int = 0):
-        self.ssl_context = ssl._create_unverified_context()
-        self._cleanup_cache(retention_days)
-
-    def _cleanup_cache(self, retention_days: int):
-        if retention_days <= 0:
-            return
-        cutoff = time.time() - (retention_days * 86400)
+# 按字节预算淘汰的内存图片缓存（LRU）。
+# 缓存中的 Image 对象在所有调用方之间共享且视为只读：需要修改时请先 copy()
+class ImageCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(img):
+        w, h = img.size
+        return w * h * len(img.getbands())
+
+    def get(self, key, record=True):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                if record: self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            if record: self.hits += 1
+            return entry[0]
+
+    def put(self, key, img):
+        size = self._sizeof(img)
+        if size > self.max_bytes: return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None: self.current_bytes -= old[1]
+            self._items[key] = (img, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._items:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None: self.current_bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# 渲染结果缓存：键 -> (内容版本, 字节)。版本不一致视为未命中，重新渲染后覆盖旧条目
+class RenderCache(ImageCache):
+    @staticmethod
+    def _sizeof(entry):
+        return len(entry[1])
+
+    def get_render(self, key, version):
+        entry = self.get(key, record=False)
+        hit = entry is not None and entry[0] == version
+        with self._lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+        return entry[1] if hit else None
+
+    def put_render(self, key, version, data):
+        self.put(key, (version, data))
+
+# 待发送图片的临时文件目录：仅在适配器不支持直接发送字节时使用。
+# 每个文件名唯一且先写 .part 再原子改名，超过 max_age 秒的文件由后台任务清理
+class SpoolDir:
+    def __init__(self, path, max_age=600):
+        self.path = path
+        self.max_age = max_age
+
+    def write(self, data, suffix):
+        os.makedirs(self.path, exist_ok=True)
+        final_path = os.path.join(self.path, f"{uuid.uuid4().hex}{suffix}")
+        tmp_path = final_path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, final_path)
+        return final_path
+
+    def cleanup(self):
+        cutoff = time.time() - self.max_age
+        removed = 0
         try:
-            for name in os.listdir(IMAGES_DIR):
-                path = os.path.join(IMAGES_DIR, name)
+            for name in os.listdir(self.path):
+                path = os.path.join(self.path, name)
                 try:
-                    if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    if os.path.getmtime(path) < cutoff:
                         os.remove(path)
+                        removed += 1
                 except Exception:
                     continue
         except Exception:
             pass
+        return removed
+
+# 磁盘图片缓存：文件大小与最近访问时间记录在 image_index 表中。
+# 写入与命中只在内存中登记，由后台任务批量写回并按 LRU 淘汰，超出预算后删到预算的 90%
+class DiskCache:
+    EVICT_INTERVAL = 600
+    EVICT_TARGET = 0.9
+
+    def __init__(self, db, directory, max_bytes=0, retention_days=0):
+        self.db = db
+        self.directory = directory
+        # max_bytes 为 0 表示不限制总大小；retention_days 为 0 表示不按未使用天数清理
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def record(self, path, size):
+        with self._lock:
+            self._pending[os.path.basename(path)] = (size, time.time())
+
+    def touch(self, path):
+        name = os.path.basename(path)
+        with self._lock:
+            prev = self._pending.get(name)
+            self._pending[name] = (prev[0] if prev else None, time.time())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self.db.sync_image_index([(name, size, ts) for name, (size, ts) in pending.items()])
+
+    def reconcile(self):
+        # 以目录实际内容为准：补录索引中没有的文件（访问时间取 mtime），删除已不存在文件的记录
+        files = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.name.endswith(".tmp"): continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files[entry.name] = (st.st_size, st.st_mtime)
+        except FileNotFoundError:
+            pass
+        self.flush()
+        self.db.reconcile_image_index(files)
+
+    def evict(self):
+        with self._evict_lock:
+            self.flush()
+            rows = self.db.list_image_index()
+            total = sum(size for _, size, _ in rows)
+            cutoff = time.time() - self.retention_days * 86400 if self.retention_days > 0 else None
+            target = self.max_bytes * self.EVICT_TARGET if self.max_bytes and total > self.max_bytes else None
+            victims = []
+            # rows 按最近访问时间升序，遇到既未过期又无需腾空间的条目即可停止
+            for name, size, last_access in rows:
+                if (cutoff is not None and last_access < cutoff) or (target is not None and total > target):
+                    victims.append(name)
+                    total -= size
+                else:
+                    break
+            removed, freed = self._remove(victims)
+            self.evicted_files += len(removed)
+            self.evicted_bytes += freed
+            return removed, freed
+
+    def purge(self, mode, days=0):
+        # mode: "all" 全部、"derived" 仅缩略图、"unused" 超过 days 天未使用
+        with self._evict_lock:
+            if mode == "all":
+                self.reconcile()
+            else:
+                self.flush()
+            cutoff = time.time() - days * 86400
+            victims = []
+            for name, _, last_access in self.db.list_image_index():
+                if mode == "all" or (mode == "derived" and "_" in name) or (mode == "unused" and last_access < cutoff):
+                    victims.append(name)
+            removed, freed = self._remove(victims)
+            # 写了一半的下载临时文件同样清理
+            try:
+                for name in os.listdir(self.directory):
+                    if name.endswith(".tmp"):
+                        path = os.path.join(self.directory, name)
+                        try:
+                            freed += os.path.getsize(path)
+                            os.remove(path)
+                        except OSError:
+                            pass
+            except FileNotFoundError:
+                pass
+            return removed, freed
+
+    def _remove(self, names):
+        removed, freed, gone = [], 0, []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                gone.append(name)
+                continue
+            except OSError:
+                continue
+            removed.append(path)
+            gone.append(name)
+            freed += size
+        if gone:
+            self.db.delete_image_index(gone)
+        return removed, freed
+
+    def stats(self):
+        self.flush()
+        count, total = self.db.image_index_stats()
+        return {
+            "files": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+class ImageManager:
+    IMAGE_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://buff.163.com/',
+        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'
+    }
+
+    def __init__(self, http: HttpClient, disk: DiskCache, cache_bytes: int = 64 * 1024 * 1024, max_downloads: int = 8):
+        self.http = http
+        self.disk = disk
+        # 原图与缩放后的派生图共用一个内存缓存，键为磁盘文件路径
+        self.cache = ImageCache(cache_bytes)
+        # 同一 URL 同时只下载一次，其余调用方等待同一个任务；全局下载并发受信号量限制
+        self._inflight = {}
+        # 派生图同理：同一 (url, 尺寸, 重采样) 同时只缩放一次
+        self._derive_inflight = {}
+        self._download_sem = asyncio.Semaphore(max_downloads)
 
     def _get_file_path(self, url):
         hash_name = hashlib.md5(url.encode()).hexdigest()
         return os.path.join(IMAGES_DIR, f"{hash_name}.png")
 
-    @lru_cache(maxsize=128)
-    def get_cached_image(self, file_path):
+    def _get_derived_path(self, url, size, resample):
+        hash_name = hashlib.md5(url.encode()).hexdigest()
+        return os.path.join(IMAGES_DIR, f"{hash_name}_{size[0]}x{size[1]}_{resample}.png")
+
+    @staticmethod
+    def _resize(img, size, resample):
+        # size 高为 0 表示按宽度等比缩放（与封面原逻辑一致），否则按 thumbnail 语义等比缩入方框
+        method = getattr(Image.Resampling, resample.upper())
+        if size[1] == 0:
+            h = int(img.size[1] * (size[0] / float(img.size[0])))
+            return img.resize((size[0], h), method)
+        thumb = img.copy()
+        thumb.thumbnail(size, method)
+        return thumb
+
+    def get_thumbnail_sync(self, url, size, resample="bicubic"):
+        if not url: return None
+        derived_path = self._get_derived_path(url, size, resample)
+        # 内存命中与否已在 get_thumbnail 中计数，这里只检查磁盘上的派生图
+        img = self.get_cached_image(derived_path, record=False)
+        if img is not None: return img
+
+        file_path = self._get_file_path(url)
+        original = self.get_cached_image(file_path)
+        if original is None: return None
+        img = self._resize(original, size, resample)
+        try:
+            # 与原图一样先写临时文件再原子替换，渲染进程可能同时读取该文件
+            tmp_path = f"{derived_path}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, format="PNG")
+            os.replace(tmp_path, derived_path)
+            self.disk.record(derived_path, os.path.getsize(derived_path))
+        except Exception:
+            pass
+        self.cache.put(derived_path, img)
+        return img
+
+    async def get_thumbnail(self, url, size, resample="bicubic"):
+        if not url: return None
+        derived_path = self._get_derived_path(url, size, resample)
+        img = self.cache.get(derived_path)
+        if img is not None:
+            self.disk.touch(derived_path)
+            return img
+        if not os.path.exists(self._get_file_path(url)):
+            if await self.get_image(url) is None: return None
+        task = self._derive_inflight.get(derived_path)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self.get_thumbnail_sync, url, size, resample))
+            self._derive_inflight[derived_path] = task
+            task.add_done_callback(lambda _: self._derive_inflight.pop(derived_path, None))
+        try:
+            return await asyncio.shield(task)
+        except: return None
+
+    def get_cached_image(self, file_path, record=True):
+        _load_pil()
+        img = self.cache.get(file_path, record=record)
+        if img is not None:
+            self.disk.touch(file_path)
+            return img
         try:
             if os.path.exists(file_path) and os.path.getsize(file_path) > 100:
+                self.disk.touch(file_path)
                 img = Image.open(file_path).convert("RGBA")
+                self.cache.put(file_path, img)
                 return img
         except: return None
         return None
@@ -154,30 +935,55 @@ class ImageManager:
         file_path = self._get_file_path(url)
         if os.path.exists(file_path):
             return self.get_cached_image(file_path)
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, file_path))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
         try:
-            return await asyncio.to_thread(self._download_sync, url, file_path)
+            # shield：某个调用方被取消时不影响其他等待同一下载的调用方
+            return await asyncio.shield(task)
         except: return None
 
-    def _download_sync(self, url, file_path):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Referer': 'https://buff.163.com/',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'
-        }
+    async def _download(self, url, file_path):
+        async with self._download_sem:
+            if os.path.exists(file_path):
+                return self.get_cached_image(file_path)
+            try:
+                data = await self.http.request(url, headers=self.IMAGE_HEADERS)
+            except Exception:
+                return None
+        if not data or len(data) < 100: return None
+        return await asyncio.to_thread(self._store_image, data, file_path)
+
+    def _store_image(self, data, file_path):
+        _load_pil()
         try:
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=15, context=self.ssl_context) as response:
-                data = response.read()
-                if len(data) < 100: return None
-                with open(file_path, "wb") as f: f.write(data)
-                return Image.open(BytesIO(data)).convert("RGBA")
+            # 先写临时文件再原子替换，避免并发读取到写了一半的缓存
+            tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f: f.write(data)
+            os.replace(tmp_path, file_path)
+            self.disk.record(file_path, len(data))
+            img = Image.open(BytesIO(data)).convert("RGBA")
+            self.cache.put(file_path, img)
+            return img
         except: return None
 
 # ================= 辅助类：数据库管理 =================
 class DatabaseManager:
+    BUSY_TIMEOUT = 5.0
+    READER_POOL_SIZE = 4
+
     def __init__(self):
         self.db_path = DB_FILE
         self._ensure_structure()
+        # 单个长连接负责写入（串行化），读连接放在池中复用；WAL 模式下读写互不阻塞
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._readers = queue.LifoQueue(maxsize=self.READER_POOL_SIZE)
+        self._closed = False
+        # 用户库存内容版本（进程内），每次写入提交后递增，用于判断库存图缓存是否过期
+        self._user_versions = {}
         self._init_db()
 
     def _ensure_structure(self):
@@ -190,13 +996,63 @@ class DatabaseManager:
             except Exception as e:
                 print(f"[Init] 移动数据库失败: {e}")
 
-    def _get_conn(self):
-        return sqlite3.connect(self.db_path)
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.BUSY_TIMEOUT * 1000)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        with self._write_lock:
+            if self._closed: raise sqlite3.ProgrammingError("DatabaseManager 已关闭")
+            conn = self._writer
+            try:
+                yield conn.cursor()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def _read(self):
+        if self._closed: raise sqlite3.ProgrammingError("DatabaseManager 已关闭")
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn.cursor()
+        finally:
+            if conn.in_transaction: conn.rollback()
+            try:
+                if self._closed: raise queue.Full
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        with self._write_lock:
+            if self._closed: return
+            self._closed = True
+            try:
+                self._writer.execute("PRAGMA optimize")
+            except Exception:
+                pass
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
 
     def _init_db(self):
-        conn = self._get_conn()
-        c = conn.cursor()
-        
+        with self._write() as c:
+            self._create_schema(c)
+
+    def _create_schema(self, c):
         c.execute('''CREATE TABLE IF NOT EXISTS history (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         user_key TEXT NOT NULL,
@@ -212,7 +1068,9 @@ class DatabaseManager:
             columns = [col[1] for col in c.fetchall()]
             if 'img_url' not in columns: c.execute("ALTER TABLE history ADD COLUMN img_url TEXT")
         except: pass
-        c.execute('''CREATE INDEX IF NOT EXISTS idx_user_key ON history (user_key)''')
+        # (user_key, id) 复合索引同时覆盖按用户过滤和“最近稀有掉落”倒序扫描
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_history_user_id ON history (user_key, id)''')
+        c.execute('''DROP INDEX IF EXISTS idx_user_key''')
         
         c.execute('''CREATE TABLE IF NOT EXISTS user_stats (
                         user_key TEXT NOT NULL,
@@ -225,6 +1083,11 @@ class DatabaseManager:
                         img_url TEXT,
                         type TEXT
                     )''')
+        try:
+            c.execute("PRAGMA table_info(containers)")
+            columns = [col[1] for col in c.fetchall()]
+            if 'content_hash' not in columns: c.execute("ALTER TABLE containers ADD COLUMN content_hash TEXT")
+        except: pass
         c.execute('''CREATE TABLE IF NOT EXISTS items (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         container_name TEXT,
@@ -245,42 +1108,180 @@ class DatabaseManager:
                     )''')
         c.execute('''CREATE INDEX IF NOT EXISTS idx_open_limit_user_period ON open_limit_state (user_key, period_key)''')
 
-        conn.commit()
-        conn.close()
+        # 稀有掉落按品质的增量计数与每位用户的总数缓存，库存查询无需再对 history 做 GROUP BY
+        c.execute('''CREATE TABLE IF NOT EXISTS user_rare_stats (
+                        user_key TEXT NOT NULL,
+                        quality TEXT NOT NULL,
+                        count INTEGER DEFAULT 0,
+                        PRIMARY KEY (user_key, quality)
+                    )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS user_totals (
+                        user_key TEXT PRIMARY KEY,
+                        total INTEGER NOT NULL DEFAULT 0
+                    )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS schema_meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    )''')
+        # 武器箱同步的断点与暂存表：每个容器抓取完成即写入暂存，中断后可从未完成的容器继续
+        c.execute('''CREATE TABLE IF NOT EXISTS sync_runs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        status TEXT NOT NULL,
+                        started_at TEXT NOT NULL,
+                        finished_at TEXT
+                    )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS sync_containers (
+                        run_id INTEGER NOT NULL,
+                        container_id TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        img_url TEXT,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        PRIMARY KEY (run_id, name)
+                    )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS staging_items (
+                        run_id INTEGER NOT NULL,
+                        container_name TEXT NOT NULL,
+                        short_name TEXT,
+                        quality TEXT,
+                        img_url TEXT
+                    )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_staging_run ON staging_items (run_id, container_name)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS price_cache (
+                        kind TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        PRIMARY KEY (kind, key)
+                    )''')
+
+        # 磁盘图片缓存索引（文件名、字节数、最近访问时间），用于按 LRU 淘汰
+        c.execute('''CREATE TABLE IF NOT EXISTS image_index (
+                        name TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        last_access REAL NOT NULL
+                    )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_image_index_access ON image_index (last_access)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS price_mirror (
+                        short_name TEXT PRIMARY KEY,
+                        goods_id TEXT,
+                        name TEXT,
+                        buff, yyyp, steam,
+                        img_url TEXT,
+                        source_updated_at TEXT,
+                        fetched_at REAL NOT NULL
+                    )''')
+        # queried_at：最近一次被用户查询的时间，后台同步只刷新近期被查询过的物品
+        try:
+            c.execute("PRAGMA table_info(price_mirror)")
+            columns = [col[1] for col in c.fetchall()]
+            if 'queried_at' not in columns: c.execute("ALTER TABLE price_mirror ADD COLUMN queried_at REAL")
+        except: pass
+        # trigram 分词支持中文任意子串匹配（需 SQLite 3.34+），不可用时退回 LIKE 扫描
+        try:
+            c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS price_fts USING fts5(short_name, tokenize='trigram')")
+            self.price_fts = True
+        except sqlite3.OperationalError:
+            self.price_fts = False
+
+        # 旧版本或随插件附带的数据库没有 catalog_version，首次打开时写入新值，避免沿用旧的目录快照
+        c.execute("INSERT OR IGNORE INTO schema_meta (key, value) VALUES ('catalog_version', ?)", (str(time.time_ns()),))
+
+        c.execute("SELECT value FROM schema_meta WHERE key='aggregates'")
+        if not c.fetchone():
+            self._rebuild_aggregates(c)
+            c.execute("INSERT OR REPLACE INTO schema_meta (key, value) VALUES ('aggregates', '1')")
+
+    def _rebuild_aggregates(self, c):
+        c.execute("DELETE FROM user_rare_stats")
+        c.execute("DELETE FROM user_totals")
+        c.execute("""INSERT INTO user_rare_stats (user_key, quality, count)
+                     SELECT user_key, quality, count(*) FROM history GROUP BY user_key, quality""")
+        c.execute("""INSERT INTO user_totals (user_key, total)
+                     SELECT user_key, SUM(count) FROM (
+                         SELECT user_key, count FROM user_stats
+                         UNION ALL
+                         SELECT user_key, count FROM user_rare_stats
+                     ) GROUP BY user_key""")
+
+    def _bump_aggregates(self, c, user_key, rare_counts, total_delta):
+        if rare_counts:
+            c.executemany("""
+                INSERT INTO user_rare_stats (user_key, quality, count) VALUES (?, ?, ?)
+                ON CONFLICT(user_key, quality) DO UPDATE SET count = count + excluded.count
+            """, [(user_key, q, n) for q, n in rare_counts.items()])
+        if total_delta:
+            c.execute("""
+                INSERT INTO user_totals (user_key, total) VALUES (?, ?)
+                ON CONFLICT(user_key) DO UPDATE SET total = total + excluded.total
+            """, (user_key, total_delta))
+
+    def _consume_quota(self, c, user_key, period_key, request_count, daily_limit, now_text):
+        c.execute("SELECT opened_count FROM open_limit_state WHERE user_key=? AND period_key=?", (user_key, period_key))
+        row = c.fetchone()
+        used_today = int(row[0]) if row else 0
+
+        if daily_limit > 0:
+            remaining = max(0, daily_limit - used_today)
+            allowed_count = min(request_count, remaining)
+        else:
+            allowed_count = request_count
+
+        new_used = used_today + allowed_count
+        if row:
+            c.execute("""UPDATE open_limit_state SET opened_count=?, last_open_at=?, updated_at=?
+                         WHERE user_key=? AND period_key=?""", (new_used, now_text, now_text, user_key, period_key))
+        else:
+            c.execute("""INSERT INTO open_limit_state (user_key, period_key, opened_count, last_open_at, updated_at)
+                         VALUES (?, ?, ?, ?, ?)""", (user_key, period_key, new_used, now_text, now_text))
+        return allowed_count, new_used, (max(0, daily_limit - new_used) if daily_limit > 0 else -1)
 
     def consume_daily_quota(self, user_key, period_key, request_count, daily_limit, now_text):
         if request_count <= 0:
             return 0, 0, daily_limit if daily_limit > 0 else -1
 
-        conn = self._get_conn()
-        c = conn.cursor()
-        try:
+        with self._write() as c:
             c.execute("BEGIN IMMEDIATE")
-            c.execute("SELECT opened_count FROM open_limit_state WHERE user_key=? AND period_key=?", (user_key, period_key))
-            row = c.fetchone()
-            used_today = int(row[0]) if row else 0
+            return self._consume_quota(c, user_key, period_key, request_count, daily_limit, now_text)
 
-            if daily_limit > 0:
-                remaining = max(0, daily_limit - used_today)
-                allowed_count = min(request_count, remaining)
-            else:
-                allowed_count = request_count
+    def record_open_batch(self, user_key, draw, request_count, period_key, daily_limit, now_text):
+        # 单事务完成一次开箱请求：扣减额度 -> 按可用额度抽取 -> 普通品质聚合计数 -> 稀有掉落批量写入 -> 返回最新总数
+        # draw(n) 返回 OpenBatch，额度用尽时不抽取；返回 (batch, allowed_count, used_today, remaining_today, total)
+        with self._write() as c:
+            c.execute("BEGIN IMMEDIATE")
+            allowed_count, used_today, remaining_today = self._consume_quota(
+                c, user_key, period_key, request_count, daily_limit, now_text)
+            if allowed_count <= 0:
+                return None, allowed_count, used_today, remaining_today, 0
+            batch = draw(allowed_count)
+
+            # 普通品质只需按品质计数，只有稀有掉落才转换成 dict 写入 history
+            stats_counts = {}
+            rare_counts = {}
+            for quality, n in batch.quality_counts().items():
+                if quality in RARE_QUALITIES: rare_counts[quality] = n
+                else: stats_counts[quality] = n
+            history_rows = []
+            for row in batch.rare_rows():
+                item = batch[row]
+                history_rows.append((user_key, item['name'], item['quality'], item['wear_value'], 1, item.get('img', '')))
 
-            new_used = used_today + allowed_count
-            if row:
-                c.execute("""UPDATE open_limit_state SET opened_count=?, last_open_at=?, updated_at=?
-                             WHERE user_key=? AND period_key=?""", (new_used, now_text, now_text, user_key, period_key))
-            else:
-                c.execute("""INSERT INTO open_limit_state (user_key, period_key, opened_count, last_open_at, updated_at)
-                             VALUES (?, ?, ?, ?, ?)""", (user_key, period_key, new_used, now_text, now_text))
+            if stats_counts:
+                c.executemany("""
+                    INSERT INTO user_stats (user_key, quality, count) VALUES (?, ?, ?)
+                    ON CONFLICT(user_key, quality) DO UPDATE SET count = count + excluded.count
+                """, [(user_key, q, n) for q, n in stats_counts.items()])
+            if history_rows:
+                c.executemany("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)", history_rows)
 
-            conn.commit()
-            return allowed_count, new_used, (max(0, daily_limit - new_used) if daily_limit > 0 else -1)
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
+            self._bump_aggregates(c, user_key, rare_counts, allowed_count)
+
+            c.execute("SELECT total FROM user_totals WHERE user_key=?", (user_key,))
+            row = c.fetchone()
+            total = row[0] if row else 0
+        self._bump_user_version(user_key)
+        return batch, allowed_count, used_today, remaining_today, total
 
     def migrate_json_history(self, item_img_map):
         target_json = None
@@ -288,12 +1289,9 @@ class DatabaseManager:
         elif os.path.exists(OLD_HISTORY_FILE_IN_DATA): target_json = OLD_HISTORY_FILE_IN_DATA
         if not target_json: return
         
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("SELECT count(*) FROM user_stats")
-        if c.fetchone()[0] > 0:
-            conn.close()
-            return
+        with self._read() as c:
+            c.execute("SELECT count(*) FROM user_stats")
+            if c.fetchone()[0] > 0: return
 
         print(f"正在从 {target_json} 迁移历史记录...")
         try:
@@ -313,102 +1311,464 @@ class DatabaseManager:
                 for quality, count in data.get("other_stats", {}).items():
                     if count > 0: stats_rows.append((uid, quality, count))
             
-            if history_rows: c.executemany("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)", history_rows)
-            if stats_rows: c.executemany("INSERT OR REPLACE INTO user_stats (user_key, quality, count) VALUES (?, ?, ?)", stats_rows)
-            conn.commit()
+            with self._write() as c:
+                if history_rows: c.executemany("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)", history_rows)
+                if stats_rows: c.executemany("INSERT OR REPLACE INTO user_stats (user_key, quality, count) VALUES (?, ?, ?)", stats_rows)
+                self._rebuild_aggregates(c)
             print("迁移完成。")
             os.rename(target_json, target_json + ".bak")
         except Exception as e: print(f"历史迁移警告: {e}")
-        finally: conn.close()
+
+    @staticmethod
+    def _content_hash(items):
+        rows = sorted((i.get("short_name") or "", i.get("rln") or "", i.get("img") or "") for i in items)
+        return hashlib.sha1(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
 
     def save_all_data(self, new_cases, new_imgs):
-        conn = self._get_conn()
-        c = conn.cursor()
+        # 按容器内容哈希做增量更新：只重写发生变化的容器，未变化容器的物品 id 保持不变。
+        # 返回 (changed, removed) 两个容器名集合；写入失败返回 None
         try:
-            c.execute("DELETE FROM items")
-            c.execute("DELETE FROM containers")
-            for name, items in new_cases.items():
-                img = new_imgs.get(name, "")
-                c.execute("INSERT INTO containers (name, img_url) VALUES (?, ?)", (name, img))
-                rows = []
-                for item in items:
-                    rows.append((name, item.get("short_name"), item.get("rln"), item.get("img")))
-                c.executemany("INSERT INTO items (container_name, short_name, quality, img_url) VALUES (?, ?, ?, ?)", rows)
-            conn.commit()
-            return True
+            with self._write() as c:
+                c.execute("SELECT name, img_url, content_hash FROM containers")
+                existing = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+                changed, removed = set(), set(existing) - set(new_cases)
+                for name, items in new_cases.items():
+                    img = new_imgs.get(name, "")
+                    content_hash = self._content_hash(items)
+                    old = existing.get(name)
+                    if old == (img, content_hash): continue
+                    changed.add(name)
+                    c.execute("""INSERT INTO containers (name, img_url, content_hash) VALUES (?, ?, ?)
+                                 ON CONFLICT(name) DO UPDATE SET img_url=excluded.img_url, content_hash=excluded.content_hash""",
+                              (name, img, content_hash))
+                    if old is not None and old[1] == content_hash: continue
+                    c.execute("DELETE FROM items WHERE container_name=?", (name,))
+                    rows = []
+                    for item in items:
+                        rows.append((name, item.get("short_name"), item.get("rln"), item.get("img")))
+                    c.executemany("INSERT INTO items (container_name, short_name, quality, img_url) VALUES (?, ?, ?, ?)", rows)
+                for name in removed:
+                    c.execute("DELETE FROM items WHERE container_name=?", (name,))
+                    c.execute("DELETE FROM containers WHERE name=?", (name,))
+                # 目录版本号随内容变化更新，用于判断磁盘上的目录快照是否过期
+                if changed or removed:
+                    c.execute("INSERT OR REPLACE INTO schema_meta (key, value) VALUES ('catalog_version', ?)", (str(time.time_ns()),))
+            return changed, removed
         except Exception as e:
             print(f"保存失败: {e}")
-            return False
-        finally: conn.close()
+            return None
+
+    def get_catalog_version(self):
+        # catalog_version 之外附加目录内容指纹：直接替换或恢复数据库文件时 catalog_version 可能不变
+        with self._read() as c:
+            c.execute("SELECT value FROM schema_meta WHERE key='catalog_version'")
+            row = c.fetchone()
+            c.execute("SELECT count(*), COALESCE(max(id), 0) FROM items")
+            item_count, max_id = c.fetchone()
+            c.execute("SELECT name, COALESCE(img_url, ''), COALESCE(content_hash, '') FROM containers ORDER BY name")
+            digest = hashlib.md5("|".join(":".join(r) for r in c.fetchall()).encode()).hexdigest()[:16]
+        return f"{row[0] if row else '0'}-{item_count}-{max_id}-{digest}"
+
+    def load_containers(self, names):
+        case_data, images_map = {}, {}
+        with self._read() as c:
+            for name in names:
+                c.execute("SELECT img_url FROM containers WHERE name=?", (name,))
+                row = c.fetchone()
+                if row is None: continue
+                images_map[name] = row[0]
+                c.execute("SELECT short_name, quality, img_url FROM items WHERE container_name=? ORDER BY id", (name,))
+                case_data[name] = c.fetchall()
+        return case_data, images_map
+
+    def get_active_sync(self):
+        # 返回 (run_id, started_at)，没有未完成的同步时返回 None
+        with self._read() as c:
+            c.execute("SELECT id, started_at FROM sync_runs WHERE status='running' ORDER BY id DESC LIMIT 1")
+            return c.fetchone()
+
+    def abandon_sync(self, run_id, now_text):
+        with self._write() as c:
+            c.execute("UPDATE sync_runs SET status='abandoned', finished_at=? WHERE id=?", (now_text, run_id))
+            c.execute("DELETE FROM staging_items WHERE run_id=?", (run_id,))
+            c.execute("DELETE FROM sync_containers WHERE run_id=?", (run_id,))
+
+    def start_sync(self, containers, now_text):
+        with self._write() as c:
+            c.execute("INSERT INTO sync_runs (status, started_at) VALUES ('running', ?)", (now_text,))
+            run_id = c.lastrowid
+            c.executemany("INSERT OR IGNORE INTO sync_containers (run_id, container_id, name, img_url) VALUES (?, ?, ?, ?)",
+                          [(run_id, str(cid), name, img) for cid, name, img in containers])
+        return run_id
+
+    def get_sync_progress(self, run_id):
+        with self._read() as c:
+            c.execute("SELECT status, count(*) FROM sync_containers WHERE run_id=? GROUP BY status", (run_id,))
+            return dict(c.fetchall())
+
+    def pending_sync_containers(self, run_id):
+        with self._read() as c:
+            c.execute("SELECT container_id, name, img_url FROM sync_containers WHERE run_id=? AND status!='done'", (run_id,))
+            return c.fetchall()
+
+    def stage_container(self, run_id, name, items):
+        # items 为 None 表示抓取失败，保留为 failed 以便下次续传重试
+        with self._write() as c:
+            c.execute("DELETE FROM staging_items WHERE run_id=? AND container_name=?", (run_id, name))
+            if items is None:
+                c.execute("UPDATE sync_containers SET status='failed' WHERE run_id=? AND name=?", (run_id, name))
+                return
+            c.executemany("INSERT INTO staging_items (run_id, container_name, short_name, quality, img_url) VALUES (?, ?, ?, ?, ?)",
+                          [(run_id, name, i["short_name"], i["rln"], i.get("img")) for i in items])
+            c.execute("UPDATE sync_containers SET status='done' WHERE run_id=? AND name=?", (run_id, name))
+
+    def load_staged(self, run_id):
+        new_cases, new_imgs = {}, {}
+        with self._read() as c:
+            c.execute("SELECT name, img_url FROM sync_containers WHERE run_id=? AND status='done'", (run_id,))
+            for name, img in c.fetchall():
+                if img: new_imgs[name] = img
+            c.execute("SELECT container_name, short_name, quality, img_url FROM staging_items WHERE run_id=? ORDER BY rowid", (run_id,))
+            for c_name, s_name, q, img in c.fetchall():
+                new_cases.setdefault(c_name, []).append({"short_name": s_name, "rln": q, "img": img})
+        return new_cases, new_imgs
+
+    def finish_sync(self, run_id, now_text):
+        with self._write() as c:
+            c.execute("UPDATE sync_runs SET status='done', finished_at=? WHERE id=?", (now_text, run_id))
+            c.execute("DELETE FROM staging_items WHERE run_id=?", (run_id,))
+            c.execute("DELETE FROM sync_containers WHERE run_id=?", (run_id,))
 
     def load_all_data(self):
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("SELECT name, img_url FROM containers")
-        images_map = {row[0]: row[1] for row in c.fetchall()}
-        case_data = {}
-        c.execute("SELECT container_name, short_name, quality, img_url FROM items")
-        for row in c.fetchall():
-            c_name, s_name, q, img = row
-            if c_name not in case_data: case_data[c_name] = []
-            case_data[c_name].append({"short_name": s_name, "rln": q, "img": img})
-        item_img_map = {}
-        c.execute("SELECT short_name, img_url FROM items WHERE img_url IS NOT NULL")
-        for row in c.fetchall(): item_img_map[row[0]] = row[1]
-        conn.close()
-        return case_data, images_map, item_img_map
+        # 返回 ({容器名: [(short_name, quality, img_url), ...]}, {容器名: 封面 URL})
+        with self._read() as c:
+            c.execute("SELECT name, img_url FROM containers")
+            images_map = {row[0]: row[1] for row in c.fetchall()}
+            case_data = {}
+            c.execute("SELECT container_name, short_name, quality, img_url FROM items ORDER BY id")
+            for c_name, s_name, q, img in c:
+                case_data.setdefault(c_name, []).append((s_name, q, img))
+        return case_data, images_map
+
+    def get_price_cache(self, kind, key, min_fetched_at):
+        with self._read() as c:
+            c.execute("SELECT value, fetched_at FROM price_cache WHERE kind=? AND key=? AND fetched_at>=?", (kind, key, min_fetched_at))
+            row = c.fetchone()
+        if not row: return None
+        return json.loads(row[0]), row[1]
+
+    def put_price_cache(self, kind, key, value, fetched_at):
+        with self._write() as c:
+            c.execute("INSERT OR REPLACE INTO price_cache (kind, key, value, fetched_at) VALUES (?, ?, ?, ?)",
+                      (kind, key, json.dumps(value, ensure_ascii=False), fetched_at))
+
+    def prune_price_cache(self, min_fetched_at):
+        with self._write() as c:
+            c.execute("DELETE FROM price_cache WHERE fetched_at<?", (min_fetched_at,))
+            return c.rowcount
+
+    def sync_image_index(self, entries):
+        # entries: [(文件名, 字节数, 访问时间)]，字节数为 None 表示只更新已有记录的访问时间
+        with self._write() as c:
+            c.executemany("INSERT OR REPLACE INTO image_index (name, size, last_access) VALUES (?, ?, ?)",
+                          [e for e in entries if e[1] is not None])
+            c.executemany("UPDATE image_index SET last_access=MAX(last_access, ?) WHERE name=?",
+                          [(ts, name) for name, size, ts in entries if size is None])
+
+    def reconcile_image_index(self, files):
+        # files: {文件名: (字节数, mtime)}
+        with self._write() as c:
+            c.execute("SELECT name, size FROM image_index")
+            known = dict(c.fetchall())
+            c.executemany("DELETE FROM image_index WHERE name=?", [(n,) for n in known if n not in files])
+            c.executemany("INSERT INTO image_index (name, size, last_access) VALUES (?, ?, ?)",
+                          [(n, size, mtime) for n, (size, mtime) in files.items() if n not in known])
+            c.executemany("UPDATE image_index SET size=? WHERE name=?",
+                          [(size, n) for n, (size, _) in files.items() if n in known and known[n] != size])
+
+    def list_image_index(self):
+        with self._read() as c:
+            c.execute("SELECT name, size, last_access FROM image_index ORDER BY last_access")
+            return c.fetchall()
+
+    def delete_image_index(self, names):
+        with self._write() as c:
+            c.executemany("DELETE FROM image_index WHERE name=?", [(n,) for n in names])
+
+    def image_index_stats(self):
+        with self._read() as c:
+            c.execute("SELECT count(*), COALESCE(SUM(size), 0) FROM image_index")
+            return c.fetchone()
+
+    PRICE_COLUMNS = ("short_name", "goods_id", "name", "buff", "yyyp", "steam", "img_url", "source_updated_at", "fetched_at")
+
+    def upsert_price_mirror(self, rows):
+        with self._write() as c:
+            for row in rows:
+                c.execute("SELECT 1 FROM price_mirror WHERE short_name=?", (row["short_name"],))
+                is_new = c.fetchone() is None
+                # 后台同步的行不带 queried_at，保留原有的查询时间
+                cols = self.PRICE_COLUMNS + ("queried_at",)
+                updates = ", ".join(f"{k}=excluded.{k}" for k in self.PRICE_COLUMNS[1:])
+                c.execute(f"""INSERT INTO price_mirror ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})
+                              ON CONFLICT(short_name) DO UPDATE SET {updates},
+                              queried_at=COALESCE(excluded.queried_at, price_mirror.queried_at)""",
+                          tuple(row.get(k) for k in cols))
+                if is_new and self.price_fts:
+                    c.execute("INSERT INTO price_fts (short_name) VALUES (?)", (row["short_name"],))
+
+    def search_price_mirror(self, query):
+        # 精确匹配优先，其次取包含关键词的最短名称，保证结果稳定
+        cols = ", ".join("m." + k for k in self.PRICE_COLUMNS)
+        with self._read() as c:
+            c.execute(f"SELECT {cols} FROM price_mirror m WHERE m.short_name=?", (query,))
+            row = c.fetchone()
+            if row is None and self.price_fts and len(query) >= 3:
+                c.execute(f"""SELECT {cols} FROM price_fts f JOIN price_mirror m ON m.short_name = f.short_name
+                              WHERE price_fts MATCH ? ORDER BY length(m.short_name), m.short_name LIMIT 1""",
+                          ('"' + query.replace('"', '""') + '"',))
+                row = c.fetchone()
+            elif row is None:
+                pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                c.execute(f"""SELECT {cols} FROM price_mirror m WHERE m.short_name LIKE ? ESCAPE '\\'
+                              ORDER BY length(m.short_name), m.short_name LIMIT 1""", (pattern,))
+                row = c.fetchone()
+        return dict(zip(self.PRICE_COLUMNS, row)) if row else None
+
+    def touch_price_query(self, short_name, queried_at):
+        with self._write() as c:
+            c.execute("UPDATE price_mirror SET queried_at=? WHERE short_name=?", (queried_at, short_name))
+
+    def stale_price_names(self, min_fetched_at, min_queried_at):
+        # 自 min_queried_at 起被用户查询过、且价格早于 min_fetched_at 的物品，最旧的排在前面
+        with self._read() as c:
+            c.execute("""SELECT short_name FROM price_mirror
+                         WHERE queried_at >= ? AND fetched_at < ?
+                         ORDER BY fetched_at, short_name""", (min_queried_at, min_fetched_at))
+            return [row[0] for row in c.fetchall()]
 
     def add_item(self, user_key, item):
-        conn = self._get_conn()
-        c = conn.cursor()
         quality = item['quality']
         is_rare = quality in ["隐秘", "非凡", "Contraband"] or item.get('is_special', False)
-        if is_rare:
-            c.execute("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)",
-                      (user_key, item['name'], quality, item['wear_value'], 1, item.get('img', '')))
-        else:
-            c.execute("""
-                INSERT INTO user_stats (user_key, quality, count) VALUES (?, ?, 1)
-                ON CONFLICT(user_key, quality) DO UPDATE SET count = count + 1
-            """, (user_key, quality))
-        conn.commit()
-        conn.close()
+        with self._write() as c:
+            if is_rare:
+                c.execute("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, ?, ?)",
+                          (user_key, item['name'], quality, item['wear_value'], 1, item.get('img', '')))
+            else:
+                c.execute("""
+                    INSERT INTO user_stats (user_key, quality, count) VALUES (?, ?, 1)
+                    ON CONFLICT(user_key, quality) DO UPDATE SET count = count + 1
+                """, (user_key, quality))
+            self._bump_aggregates(c, user_key, {quality: 1} if is_rare else None, 1)
+        self._bump_user_version(user_key)
+
+    def user_version(self, user_key):
+        return self._user_versions.get(user_key, 0)
+
+    def _bump_user_version(self, user_key):
+        # 必须在事务提交之后调用，保证读到新版本号的读者一定能读到新数据
+        self._user_versions[user_key] = self._user_versions.get(user_key, 0) + 1
+
+    def get_user_total(self, user_key):
+        with self._read() as c:
+            c.execute("SELECT total FROM user_totals WHERE user_key=?", (user_key,))
+            row = c.fetchone()
+        return row[0] if row else 0
 
     def get_user_stats(self, user_key):
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("SELECT quality, count FROM user_stats WHERE user_key=?", (user_key,))
-        stats = dict(c.fetchall())
-        c.execute("SELECT quality, count(*) FROM history WHERE user_key=? GROUP BY quality", (user_key,))
-        rare_stats = dict(c.fetchall())
-        for q, count in rare_stats.items():
-            stats[q] = stats.get(q, 0) + count
-        total = sum(stats.values())
-        c.execute("""
-            SELECT name, quality, wear_value, img_url
-            FROM history 
-            WHERE user_key=? 
-            AND (quality IN ('隐秘', '非凡', 'Contraband') OR is_special=1) 
-            ORDER BY id DESC LIMIT 10
-        """, (user_key,))
-        rare_items = []
-        for row in c.fetchall():
-            rare_items.append({"name": row[0], "quality": row[1], "wear_value": row[2], "img_url": row[3]})
-        conn.close()
+        with self._read() as c:
+            c.execute("SELECT quality, count FROM user_stats WHERE user_key=?", (user_key,))
+            stats = dict(c.fetchall())
+            c.execute("SELECT quality, count FROM user_rare_stats WHERE user_key=?", (user_key,))
+            for q, count in c.fetchall():
+                stats[q] = stats.get(q, 0) + count
+            c.execute("SELECT total FROM user_totals WHERE user_key=?", (user_key,))
+            row = c.fetchone()
+            total = row[0] if row else 0
+            c.execute("""
+                SELECT name, quality, wear_value, img_url
+                FROM history 
+                WHERE user_key=? 
+                AND (quality IN ('隐秘', '非凡', 'Contraband') OR is_special=1) 
+                ORDER BY id DESC LIMIT 10
+            """, (user_key,))
+            rare_items = []
+            for row in c.fetchall():
+                rare_items.append({"name": row[0], "quality": row[1], "wear_value": row[2], "img_url": row[3]})
         return {"total": total, "other_stats": stats, "items": rare_items}
 
     def clear_user_history(self, user_key):
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("DELETE FROM history WHERE user_key=?", (user_key,))
-        c.execute("DELETE FROM user_stats WHERE user_key=?", (user_key,))
-        conn.commit()
-        conn.close()
+        with self._write() as c:
+            c.execute("DELETE FROM history WHERE user_key=?", (user_key,))
+            c.execute("DELETE FROM user_stats WHERE user_key=?", (user_key,))
+            c.execute("DELETE FROM user_rare_stats WHERE user_key=?", (user_key,))
+            c.execute("DELETE FROM user_totals WHERE user_key=?", (user_key,))
+        self._bump_user_version(user_key)
+
+# ================= 辅助类：异步数据库门面 =================
+# 所有 SQLite 操作都在专用线程上执行，事件循环只 await 结果；
+# 写操作经由单线程执行器排队串行化，不同用户的写入不再争抢文件锁
+class AsyncDatabase:
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="case-db-writer")
+        self._read_executor = ThreadPoolExecutor(max_workers=DatabaseManager.READER_POOL_SIZE, thread_name_prefix="case-db-reader")
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    async def consume_daily_quota(self, *args, **kwargs):
+        return await self._run(self._write_executor, self.db.consume_daily_quota, *args, **kwargs)
+
+    async def record_open_batch(self, *args, **kwargs):
+        return await self._run(self._write_executor, self.db.record_open_batch, *args, **kwargs)
+
+    async def add_item(self, user_key, item):
+        return await self._run(self._write_executor, self.db.add_item, user_key, item)
+
+    async def clear_user_history(self, user_key):
+        return await self._run(self._write_executor, self.db.clear_user_history, user_key)
+
+    async def save_all_data(self, new_cases, new_imgs):
+        return await self._run(self._write_executor, self.db.save_all_data, new_cases, new_imgs)
+
+    async def get_active_sync(self):
+        return await self._run(self._read_executor, self.db.get_active_sync)
+
+    async def abandon_sync(self, run_id, now_text):
+        return await self._run(self._write_executor, self.db.abandon_sync, run_id, now_text)
+
+    async def start_sync(self, containers, now_text):
+        return await self._run(self._write_executor, self.db.start_sync, containers, now_text)
+
+    async def get_sync_progress(self, run_id):
+        return await self._run(self._read_executor, self.db.get_sync_progress, run_id)
+
+    async def pending_sync_containers(self, run_id):
+        return await self._run(self._read_executor, self.db.pending_sync_containers, run_id)
+
+    async def stage_container(self, run_id, name, items):
+        return await self._run(self._write_executor, self.db.stage_container, run_id, name, items)
+
+    async def load_staged(self, run_id):
+        return await self._run(self._read_executor, self.db.load_staged, run_id)
+
+    async def finish_sync(self, run_id, now_text):
+        return await self._run(self._write_executor, self.db.finish_sync, run_id, now_text)
+
+    def user_version(self, user_key):
+        return self.db.user_version(user_key)
+
+    async def get_catalog_version(self):
+        return await self._run(self._read_executor, self.db.get_catalog_version)
+
+    async def get_user_total(self, user_key):
+        return await self._run(self._read_executor, self.db.get_user_total, user_key)
+
+    async def get_user_stats(self, user_key):
+        return await self._run(self._read_executor, self.db.get_user_stats, user_key)
+
+    async def load_containers(self, names):
+        return await self._run(self._read_executor, self.db.load_containers, names)
+
+    async def load_all_data(self):
+        return await self._run(self._read_executor, self.db.load_all_data)
+
+    async def upsert_price_mirror(self, rows):
+        return await self._run(self._write_executor, self.db.upsert_price_mirror, rows)
+
+    async def search_price_mirror(self, query):
+        return await self._run(self._read_executor, self.db.search_price_mirror, query)
+
+    async def touch_price_query(self, short_name, queried_at):
+        return await self._run(self._write_executor, self.db.touch_price_query, short_name, queried_at)
+
+    async def stale_price_names(self, min_fetched_at, min_queried_at):
+        return await self._run(self._read_executor, self.db.stale_price_names, min_fetched_at, min_queried_at)
+
+    async def get_price_cache(self, kind, key, min_fetched_at):
+        return await self._run(self._read_executor, self.db.get_price_cache, kind, key, min_fetched_at)
+
+    async def put_price_cache(self, kind, key, value, fetched_at):
+        return await self._run(self._write_executor, self.db.put_price_cache, kind, key, value, fetched_at)
+
+    async def prune_price_cache(self, min_fetched_at):
+        return await self._run(self._write_executor, self.db.prune_price_cache, min_fetched_at)
+
+    async def close(self):
+        # 等待排队中的写入落盘后再关闭连接
+        await asyncio.to_thread(self._write_executor.shutdown, wait=True)
+        await asyncio.to_thread(self._read_executor.shutdown, wait=True)
+        self.db.close()
+
+# ================= 辅助类：价格缓存 =================
+# 两级 TTL 缓存：内存命中直接返回，其次查 SQLite，都未命中才请求 API。
+# 相同 key 的并发查询合并为一次请求，API 请求统一经过令牌桶限速
+class PriceCache:
+    MEMORY_ENTRIES = 512
+    # 数据库中的缓存行在写入时顺带清理，两次清理至少间隔该秒数
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, adb: AsyncDatabase, rate: float, max_ttl: float = 0):
+        self.adb = adb
+        self.bucket = TokenBucket(rate, burst=2)
+        # 各类查询中最长的缓存时间，早于它的行不会再被任何查询命中
+        self.max_ttl = max_ttl
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._last_prune = 0.0
+
+    def _remember(self, kind, key, value, expires_at):
+        self._memory[(kind, key)] = (expires_at, value)
+        self._memory.move_to_end((kind, key))
+        while len(self._memory) > self.MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    async def get(self, kind, key, ttl, fetch):
+        now = time.time()
+        hit = self._memory.get((kind, key))
+        if hit and hit[0] > now:
+            self._memory.move_to_end((kind, key))
+            return hit[1]
+        try:
+            row = await self.adb.get_price_cache(kind, key, now - ttl)
+        except Exception:
+            row = None
+        if row is not None:
+            value, fetched_at = row
+            self._remember(kind, key, value, fetched_at + ttl)
+            return value
+        task = self._inflight.get((kind, key))
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(kind, key, ttl, fetch))
+            self._inflight[(kind, key)] = task
+            task.add_done_callback(lambda _: self._inflight.pop((kind, key), None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, kind, key, ttl, fetch):
+        await self.bucket.acquire()
+        value = await fetch()
+        # 请求失败（None）不缓存，下次查询重新请求
+        if value is None: return None
+        fetched_at = time.time()
+        self._remember(kind, key, value, fetched_at + ttl)
+        try:
+            await self.adb.put_price_cache(kind, key, value, fetched_at)
+            if fetched_at - self._last_prune >= self.PRUNE_INTERVAL:
+                self._last_prune = fetched_at
+                await self.adb.prune_price_cache(fetched_at - max(self.max_ttl, ttl))
+        except Exception as e:
+            print(f"价格缓存写入失败: {e}")
+        return value
 
 # ================= 辅助类：GIF/图片 生成器 =================
 class GifGenerator:
-    def __init__(self, image_manager):
+    def __init__(self, image_manager, render_workers: int = 0):
         self.img_mgr = image_manager
+        # render_workers > 0 时 GIF 在独立进程池中合成与编码，避免多群并发开箱时争抢 GIL
+        self.render_workers = render_workers
+        self._pool = None
         self.BASE_ITEM_SIZE = 200   
         self.MAX_ITEM_SIZE = 260    
         self.MARGIN = 20            
@@ -419,24 +1779,12 @@ class GifGenerator:
         self.HEAD_BUFFER = 8        
         self.FPS = 20               
         self.SCROLL_DURATION = 3.5  
+        self.FRAME_MERGE_PX = 1     
+        self.OUTRO_FRAMES = 20      
         
-        try:
-            # 尝试加载用户提供的字体文件，使用不同字号区分层级
-            self.font = ImageFont.truetype(FONT_PATH, 16)
-            self.font_bold = ImageFont.truetype(FONT_PATH, 20)
-            self.font_title = ImageFont.truetype(FONT_PATH, 24)
-        except Exception as e:
-            print(f"本地字体加载失败 ({FONT_PATH}): {e}，将尝试系统字体")
-            try:
-                # 备用方案：系统自带的微软雅黑
-                self.font = ImageFont.truetype("msyh.ttc", 16)
-                self.font_bold = ImageFont.truetype("msyhbd.ttc", 20)
-                self.font_title = ImageFont.truetype("msyhbd.ttc", 24)
-            except:
-                # Pillow 默认位图字体 (Linux下不支持中文)
-                self.font = ImageFont.load_default()
-                self.font_bold = self.font
-                self.font_title = self.font
+        # 字体在首次渲染时加载；多个渲染线程可能同时触发，用锁保证只加载一次
+        self._fonts_loaded = False
+        self._fonts_lock = threading.Lock()
 
     async def generate(self, winner_item, case_items, case_img_url=None):
         filler_pool = [i for i in case_items if i.get("rln") != "非凡"]
@@ -448,16 +1796,94 @@ class GifGenerator:
         scroll_items.append(winner_item) 
         for _ in range(self.TOTAL_ITEMS - self.WINNER_INDEX - 1): scroll_items.append(random.choice(filler_pool))
 
-        img_tasks = [self.img_mgr.get_image(item.get("img")) for item in scroll_items]
-        item_images = await asyncio.gather(*img_tasks)
+        strip_size = (self.BASE_ITEM_SIZE, self.BASE_ITEM_SIZE)
+        img_tasks = [self.img_mgr.get_thumbnail(item.get("img"), strip_size) for item in scroll_items]
+        # 结尾放大动画只缓存一张最大尺寸的派生图，各帧尺寸在渲染时由它缩小得到
+        winner_url = winner_item.get("img")
+        img_tasks.append(self.img_mgr.get_thumbnail(winner_url, self._outro_size()))
+        images = await asyncio.gather(*img_tasks)
+        item_images, outro_image = images[:len(scroll_items)], images[len(scroll_items)]
 
-        return await asyncio.to_thread(self._create_optimized_gif, scroll_items, item_images)
-
-    def _create_optimized_gif(self, items_data, images):
+        if self.render_workers > 0:
+            try:
+                return await self._render_in_pool(scroll_items, item_images, winner_url, outro_image)
+            except Exception as e:
+                print(f"进程池渲染失败，回退到线程渲染: {e}")
+                self.shutdown()
+        return await asyncio.to_thread(self._create_optimized_gif, scroll_items, item_images, outro_image)
+
+    async def _render_in_pool(self, scroll_items, item_images, winner_url, outro_image):
+        # 只向子进程传递品质/名称与派生图的磁盘路径，子进程自行读取缓存图片
+        strip_size = (self.BASE_ITEM_SIZE, self.BASE_ITEM_SIZE)
+        items_data = [{"rln": i.get("rln"), "name": i.get("name", "???")} for i in scroll_items]
+        strip_paths = [self.img_mgr._get_derived_path(i.get("img"), strip_size, "bicubic") if img else None
+                       for i, img in zip(scroll_items, item_images)]
+        outro_path = self.img_mgr._get_derived_path(winner_url, self._outro_size(), "bicubic") if outro_image else None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), _render_gif_in_worker, items_data, strip_paths, outro_path)
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.render_workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_render_worker)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _outro_size(self):
+        w = int(self.BASE_ITEM_SIZE * (1.0 + 0.3 * (self.OUTRO_FRAMES - 1) / self.OUTRO_FRAMES))
+        return (w, w)
+
+    def _ensure_fonts(self):
+        _load_pil()
+        if self._fonts_loaded: return
+        with self._fonts_lock:
+            if self._fonts_loaded: return
+            font_path = _find_font_path()
+            try:
+                # 尝试加载用户提供的字体文件，使用不同字号区分层级
+                self.font = ImageFont.truetype(font_path, 16)
+                self.font_bold = ImageFont.truetype(font_path, 20)
+                self.font_title = ImageFont.truetype(font_path, 24)
+            except Exception as e:
+                print(f"本地字体加载失败 ({font_path}): {e}，将尝试系统字体")
+                try:
+                    # 备用方案：系统自带的微软雅黑
+                    self.font = ImageFont.truetype("msyh.ttc", 16)
+                    self.font_bold = ImageFont.truetype("msyhbd.ttc", 20)
+                    self.font_title = ImageFont.truetype("msyhbd.ttc", 24)
+                except:
+                    # Pillow 默认位图字体 (Linux下不支持中文)
+                    self.font = ImageFont.load_default()
+                    self.font_bold = self.font
+                    self.font_title = self.font
+            self._fonts_loaded = True
+
+    def _build_overlay(self):
+        # 指针与两侧暗边每帧都一样，只绘制一次后复用，返回 (RGB 图层, 遮罩)。
+        # 原实现在 RGBA 帧上直接写入半透明色，转 RGB 后等同于不透明色，这里直接用不透明色保持输出一致
+        overlay = Image.new("RGBA", (self.VIEWPORT_W, self.VIEWPORT_H), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+        draw.rectangle([0, 0, 50, self.VIEWPORT_H], fill=(20, 20, 20, 255))
+        draw.rectangle([self.VIEWPORT_W-50, 0, self.VIEWPORT_W, self.VIEWPORT_H], fill=(20, 20, 20, 255))
+        mid = self.VIEWPORT_W // 2
+        draw.line([(mid, 15), (mid, self.VIEWPORT_H-15)], fill=(255, 215, 0, 255), width=3)
+        draw.polygon([(mid-8, 15), (mid+8, 15), (mid, 30)], fill=(255, 215, 0, 255))
+        draw.polygon([(mid-8, self.VIEWPORT_H-15), (mid+8, self.VIEWPORT_H-15), (mid, self.VIEWPORT_H-30)], fill=(255, 215, 0, 255))
+        return overlay.convert("RGB"), overlay.getchannel("A")
+
+    def _create_optimized_gif(self, items_data, images, outro_image):
+        self._ensure_fonts()
         unit_w = self.BASE_ITEM_SIZE + self.MARGIN
         total_width = len(items_data) * unit_w
+        bg_color = (30, 30, 35)
         
-        strip_img = Image.new("RGBA", (total_width, self.VIEWPORT_H), (0,0,0,0))
+        # 滚动条直接画在背景色上，之后每个滚动帧都只是它的一个裁剪
+        strip_img = Image.new("RGB", (total_width, self.VIEWPORT_H), bg_color)
         strip_draw = ImageDraw.Draw(strip_img)
         
         for idx, (item_data, img) in enumerate(zip(items_data, images)):
@@ -467,14 +1893,14 @@ class GifGenerator:
             bar_h = 6
             strip_draw.rectangle([x, draw_y + self.BASE_ITEM_SIZE, x + self.BASE_ITEM_SIZE, draw_y + self.BASE_ITEM_SIZE + bar_h], fill=q_color)
             if img:
-                i_copy = img.copy()
-                i_copy.thumbnail((self.BASE_ITEM_SIZE, self.BASE_ITEM_SIZE), Image.Resampling.BICUBIC)
-                strip_img.paste(i_copy, (x, draw_y), i_copy)
+                strip_img.paste(img, (x, draw_y), img)
 
         frames = []
+        durations = []
+        frame_ms = int(1000/self.FPS)
         scroll_frames = int(self.FPS * self.SCROLL_DURATION)
-        outro_frames = 20 
-        total_frames = scroll_frames + outro_frames
+        outro_frames = self.OUTRO_FRAMES
+        hold_frames = 20
         
         REAL_WINNER_INDEX = self.WINNER_INDEX + self.HEAD_BUFFER
         winner_center_x = REAL_WINNER_INDEX * unit_w + unit_w / 2
@@ -486,76 +1912,93 @@ class GifGenerator:
 
         def ease_out_cubic(t): return 1 - pow(1 - t, 3)
 
-        bg_color = (30, 30, 35, 255)
-        
-        for f in range(total_frames):
-            frame = Image.new("RGBA", (self.VIEWPORT_W, self.VIEWPORT_H), bg_color)
+        background = Image.new("RGB", (self.VIEWPORT_W, self.VIEWPORT_H), bg_color)
+        overlay, overlay_mask = self._build_overlay()
+
+        # 美术素材与品质色固定，整张滚动条 + 指针层只量化一次得到共享调色板，
+        # 之后所有帧都是同一调色板下的索引图，不再逐帧量化，GIF 只写一张全局色表
+        palette_src = Image.new("RGB", (total_width, self.VIEWPORT_H * 2), bg_color)
+        palette_src.paste(strip_img, (0, 0))
+        palette_src.paste(overlay, (0, self.VIEWPORT_H), overlay_mask)
+        palette_img = palette_src.quantize(colors=255, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        strip_p = strip_img.quantize(palette=palette_img, dither=Image.Dither.NONE)
+        overlay_p = overlay.quantize(palette=palette_img, dither=Image.Dither.NONE)
+
+        last_crop_x = None
+        for f in range(scroll_frames):
+            t = f / scroll_frames
+            current_scroll_x = start_scroll_x + (target_scroll_x - start_scroll_x) * ease_out_cubic(t)
+            crop_x = int(current_scroll_x)
+            crop_x = max(0, min(crop_x, strip_img.width - self.VIEWPORT_W))
+
+            # 减速尾段相邻帧位移不超过 1px，与上一帧合并为一帧并延长显示时长
+            if last_crop_x is not None and abs(crop_x - last_crop_x) <= self.FRAME_MERGE_PX:
+                durations[-1] += frame_ms
+                continue
+            last_crop_x = crop_x
+
+            frame = strip_p.crop((crop_x, 0, crop_x + self.VIEWPORT_W, self.VIEWPORT_H))
+            frame.paste(overlay_p, (0, 0), overlay_mask)
+            frames.append(frame)
+            durations.append(frame_ms)
+
+        item_data = items_data[REAL_WINNER_INDEX]
+        q_color = QUALITY_COLORS.get(item_data.get("rln"), (100, 100, 100))
+        full_name = item_data.get("name", "???")
+        short_name = full_name.split("|")[-1].strip()
+        try:
+            text_bbox = ImageDraw.Draw(background).textbbox((0, 0), short_name, font=self.font_bold)
+            text_w = text_bbox[2] - text_bbox[0]
+        except: text_w = 50
+        text_draw_x = (self.VIEWPORT_W - text_w) // 2
+
+        for f in range(outro_frames):
+            outro_progress = f / outro_frames
+            scale = 1.0 + 0.3 * outro_progress 
+
+            frame = background.copy()
             draw = ImageDraw.Draw(frame)
             
-            is_outro = f >= scroll_frames
-
-            if not is_outro:
-                t = f / scroll_frames
-                current_scroll_x = start_scroll_x + (target_scroll_x - start_scroll_x) * ease_out_cubic(t)
-                crop_x = int(current_scroll_x)
-                crop_x = max(0, min(crop_x, strip_img.width - self.VIEWPORT_W))
-                viewport_slice = strip_img.crop((crop_x, 0, crop_x + self.VIEWPORT_W, self.VIEWPORT_H))
-                frame.paste(viewport_slice, (0, 0), viewport_slice)
-                
-                draw.rectangle([0, 0, 50, self.VIEWPORT_H], fill=(20, 20, 20, 100))
-                draw.rectangle([self.VIEWPORT_W-50, 0, self.VIEWPORT_W, self.VIEWPORT_H], fill=(20, 20, 20, 100))
-                mid = self.VIEWPORT_W // 2
-                draw.line([(mid, 15), (mid, self.VIEWPORT_H-15)], fill=(255, 215, 0, 200), width=3)
-                draw.polygon([(mid-8, 15), (mid+8, 15), (mid, 30)], fill=(255, 215, 0, 255))
-                draw.polygon([(mid-8, self.VIEWPORT_H-15), (mid+8, self.VIEWPORT_H-15), (mid, self.VIEWPORT_H-30)], fill=(255, 215, 0, 255))
-
-            else:
-                outro_progress = (f - scroll_frames) / outro_frames
-                scale = 1.0 + 0.3 * outro_progress 
-                
-                item_data = items_data[REAL_WINNER_INDEX]
-                img = images[REAL_WINNER_INDEX]
-                q_color = QUALITY_COLORS.get(item_data.get("rln"), (100, 100, 100))
-                
-                draw_w = int(self.BASE_ITEM_SIZE * scale)
-                draw_h = int(self.BASE_ITEM_SIZE * scale)
-                draw_x = (self.VIEWPORT_W - draw_w) // 2 
-                draw_y = (self.VIEWPORT_H - draw_h) // 2 - 20
-                
-                bar_h = 6 * scale
-                draw.rectangle([draw_x, draw_y + draw_h, draw_x + draw_w, draw_y + draw_h + bar_h], fill=q_color)
-                
-                if img:
-                    i_zoom = img.copy()
+            draw_w = int(self.BASE_ITEM_SIZE * scale)
+            draw_h = int(self.BASE_ITEM_SIZE * scale)
+            draw_x = (self.VIEWPORT_W - draw_w) // 2 
+            draw_y = (self.VIEWPORT_H - draw_h) // 2 - 20
+            
+            bar_h = 6 * scale
+            draw.rectangle([draw_x, draw_y + draw_h, draw_x + draw_w, draw_y + draw_h + bar_h], fill=q_color)
+            
+            if outro_image:
+                i_zoom = outro_image
+                if i_zoom.width > draw_w or i_zoom.height > draw_h:
+                    i_zoom = outro_image.copy()
                     i_zoom.thumbnail((draw_w, draw_h), Image.Resampling.BICUBIC)
-                    frame.paste(i_zoom, (int(draw_x), int(draw_y)), i_zoom)
-                
-                full_name = item_data.get("name", "???")
-                short_name = full_name.split("|")[-1].strip()
-                try:
-                    text_bbox = draw.textbbox((0, 0), short_name, font=self.font_bold)
-                    text_w = text_bbox[2] - text_bbox[0]
-                except: text_w = 50
-                
-                text_draw_x = (self.VIEWPORT_W - text_w) // 2
-                text_draw_y = draw_y + draw_h + bar_h + 10
-                draw.text((text_draw_x, text_draw_y), short_name, fill=q_color, font=self.font_bold)
+                frame.paste(i_zoom, (int(draw_x), int(draw_y)), i_zoom)
+            
+            text_draw_y = draw_y + draw_h + bar_h + 10
+            draw.text((text_draw_x, text_draw_y), short_name, fill=q_color, font=self.font_bold)
 
-            frames.append(frame.convert("RGB"))
+            frames.append(frame.quantize(palette=palette_img, dither=Image.Dither.NONE))
+            durations.append(frame_ms)
 
-        if frames:
-            last_frame = frames[-1]
-            for _ in range(20): frames.append(last_frame)
+        # 结尾停留：延长最后一帧时长，而不是重复追加相同帧
+        if durations:
+            durations[-1] += hold_frames * frame_ms
 
         output = BytesIO()
         if frames:
-            frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:], duration=int(1000/self.FPS), loop=0, optimize=True)
+            # 显式传入共享调色板，否则 Pillow 会为每个差分帧再写一份局部色表
+            frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:], duration=durations, loop=0,
+                           optimize=False, palette=palette_img.getpalette())
         return output.getvalue()
 
     async def generate_inventory_card(self, stats_data, item_img_map):
-        return await asyncio.to_thread(self._create_inv_card_sync, stats_data, item_img_map)
+        # 先经共享的异步图片层并发取得全部缩略图（走内存缓存、合并重复下载），再在线程中绘制
+        urls = list(dict.fromkeys(item['img_url'] for item in stats_data['items'] if item.get('img_url')))
+        thumbs = await asyncio.gather(*(self.img_mgr.get_thumbnail(url, (70, 70), "lanczos") for url in urls))
+        return await asyncio.to_thread(self._create_inv_card_sync, stats_data, dict(zip(urls, thumbs)))
 
-    def _create_inv_card_sync(self, stats_data, item_img_map):
+    def _create_inv_card_sync(self, stats_data, thumbnails):
+        self._ensure_fonts()
         width = 650
         header_h = 80
         stats_h = 100
@@ -594,16 +2037,9 @@ class GifGenerator:
             
             img_url = item.get('img_url')
             if img_url:
-                local_path = self.img_mgr._get_file_path(img_url)
-                item_img_obj = None
-                if os.path.exists(local_path):
-                    try: item_img_obj = Image.open(local_path).convert("RGBA")
-                    except: pass
-                else:
-                    item_img_obj = self.img_mgr._download_sync(img_url, local_path)
+                item_img_obj = thumbnails.get(img_url)
                 
                 if item_img_obj:
-                    item_img_obj.thumbnail((70, 70), Image.Resampling.LANCZOS)
                     paste_x = padding + 15
                     paste_y = list_y + (item_h - item_img_obj.height) // 2
                     img.paste(item_img_obj, (paste_x, paste_y), item_img_obj)
@@ -622,7 +2058,11 @@ class GifGenerator:
         img.save(output, format="PNG")
         return output.getvalue()
 
+    # 帮助卡内容（指令列表、版本号）变化时递增，使缓存的帮助卡失效
+    HELP_CARD_VERSION = 3
+
     def generate_help_card(self):
+        self._ensure_fonts()
         width = 600
         commands = [
             ("> 开箱 [数量] [名称]", "开指定数量的武器箱/纪念包 (如: 开箱 10 命悬)"),
@@ -630,8 +2070,10 @@ class GifGenerator:
             ("> 查询价格 [名称]", "查询饰品BUFF/Steam参考价格"),
             ("> 武器箱列表", "查看所有可开箱的容器名称"),
             ("> 清除库存", "清空自己的所有开箱记录 (不可恢复)"),
-            ("> 更新武器箱", "(管理员) 从服务器同步最新数据"),
-            ("> 清除缓存", "(管理员) 清理本地临时图片文件"),
+            ("> 更新武器箱 [重新开始]", "(管理员) 从服务器同步最新数据"),
+            ("> 清除缓存 [天数|缩略图|全部]", "(管理员) 清理久未使用的图片缓存 (默认 7 天)"),
+            ("> 缓存状态", "(管理员) 查看图片内存与磁盘缓存占用"),
+            ("> 预热缓存", "(管理员) 后台预下载全部箱子与物品图片"),
         ]
         height = max(480, 130 + len(commands) * 70)
         img = Image.new("RGB", (width, height), (30, 30, 35))
@@ -652,27 +2094,67 @@ class GifGenerator:
         img.save(output, format="PNG")
         return output.getvalue()
 
+# ================= 进程池渲染入口 =================
+_WORKER_GIF_GEN = None
+
+def _init_render_worker():
+    global _WORKER_GIF_GEN
+    random.seed()
+    _WORKER_GIF_GEN = GifGenerator(None)
+
+def _load_render_image(path):
+    if not path: return None
+    _load_pil()
+    try:
+        return Image.open(path).convert("RGBA")
+    except Exception:
+        return None
+
+def _render_gif_in_worker(items_data, strip_paths, outro_path):
+    if _WORKER_GIF_GEN is None: _init_render_worker()
+    strip_images = [_load_render_image(p) for p in strip_paths]
+    return _WORKER_GIF_GEN._create_optimized_gif(items_data, strip_images, _load_render_image(outro_path))
+
 @register("CS武器箱开箱模拟", "luooka", "支持武器箱、纪念包、收藏品开箱模拟(带动画)", "1.3.1")
 class CasePlugin(Star):
     def __init__(self, context: Context, config: dict):
         super().__init__(context)
         self.config = config
+        _ensure_dirs()
         
         self.api_host = self.config.get('api_host', 'api.csqaq.com').replace("https://", "").replace("http://", "").strip("/")
         self.api_token = self.config.get('api_token', '')
         
-        self.net_mgr = NetworkManager(self.api_token) 
-        cache_days = self._safe_int(self.config.get("cache_retention_days", 0), 0, minimum=0)
-        self.img_mgr = ImageManager(cache_days)
-        self.gif_gen = GifGenerator(self.img_mgr)
+        http_timeout = self._safe_int(self.config.get("http_timeout", 20), 20, minimum=1)
+        self.http = HttpClient(timeout=http_timeout)
+        self.net_mgr = NetworkManager(self.api_token, self.http) 
         self.db = DatabaseManager() 
+        self.adb = AsyncDatabase(self.db)
+        cache_days = self._safe_int(self.config.get("cache_retention_days", 0), 0, minimum=0)
+        disk_mb = self._safe_int(self.config.get("disk_cache_mb", 1024), 1024, minimum=0)
+        self.disk_cache = DiskCache(self.db, IMAGES_DIR, disk_mb * 1024 * 1024, cache_days)
+        cache_mb = self._safe_int(self.config.get("image_cache_mb", 64), 64, minimum=1)
+        max_downloads = self._safe_int(self.config.get("max_concurrent_downloads", 8), 8, minimum=1)
+        self.img_mgr = ImageManager(self.http, self.disk_cache, cache_mb * 1024 * 1024, max_downloads)
+        render_workers = self._safe_int(self.config.get("render_workers", 0), 0, minimum=0)
+        self.gif_gen = GifGenerator(self.img_mgr, render_workers)
+        # 库存图、帮助卡、封面、容器列表的渲染结果按内容版本缓存
+        self.render_cache = RenderCache(16 * 1024 * 1024)
+        self.spool = SpoolDir(SPOOL_DIR)
+        try:
+            price_rate = float(self.config.get("price_rate", 0.6))
+        except Exception:
+            price_rate = 0.6
+        self.price_ttl = self._safe_int(self.config.get("price_cache_ttl", 600), 600, minimum=0)
+        # 搜索结果缓存 price_ttl * 6，是最长的缓存时间
+        self.price_cache = PriceCache(self.adb, max(price_rate, 0.05), max_ttl=self.price_ttl * 6)
+        self.price_max_age = self._safe_int(self.config.get("price_max_age", 360), 360, minimum=1) * 60
         
-        self.case_data, self.case_images, self.item_img_map = self.db.load_all_data()
+        self.case_aliases = self._load_case_aliases()
+        self.catalog = self._load_catalog()
         
         if os.path.exists(OLD_HISTORY_FILE) or os.path.exists(OLD_HISTORY_FILE_IN_DATA):
             self.db.migrate_json_history(self.item_img_map)
-            
-        self._recalculate_probabilities(self.case_data)
         
         raw_admins = self.config.get("admins", "510591108")
         if isinstance(raw_admins, list):
@@ -680,8 +2162,85 @@ class CasePlugin(Star):
         else:
             self.admins = [x.strip() for x in str(raw_admins).replace("，", ",").split(",") if x.strip()]
             
+        self._bg_tasks = set()
+        self._bg_started = False
+        self._prewarm_task = None
+        self._sync_running = False
+        self._prewarm_state = {}
+        self._start_background_tasks()
+
         print(f"插件加载完成 (v1.3.1)。Config: Number={self.config.get('max_open_per_request', 50)}, Admins={self.admins}")
 
+    def _spawn_background(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    def _start_background_tasks(self):
+        # 插件可能在事件循环启动前被构造，此时推迟到收到第一条消息时再启动后台任务
+        if self._bg_started: return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._bg_started = True
+        self._spawn_background(self._spool_cleanup_loop())
+        self._spawn_background(self._disk_cache_loop())
+        if self.config.get("prewarm_on_startup", False):
+            self._start_prewarm()
+        if self.api_token and self._safe_int(self.config.get("price_sync_interval", 0), 0, minimum=0) > 0:
+            self._spawn_background(self._price_sync_loop())
+
+    def _remove_legacy_temp_files(self):
+        # 旧版本以固定文件名写在图片缓存目录中的回复图片
+        try:
+            for name in os.listdir(IMAGES_DIR):
+                if re.match(r"^(temp_.*\.gif|temp_rare_.*\.gif|cover_.*\.png|inv_.*\.png)$", name):
+                    try: os.remove(os.path.join(IMAGES_DIR, name))
+                    except Exception: pass
+        except Exception:
+            pass
+
+    async def _disk_cache_loop(self):
+        # 启动时先按目录内容校正索引，之后定期写回访问记录并淘汰
+        try:
+            await asyncio.to_thread(self.disk_cache.reconcile)
+        except Exception as e:
+            print(f"磁盘缓存索引校正失败: {e}")
+        while True:
+            try:
+                removed, freed = await asyncio.to_thread(self.disk_cache.evict)
+                for path in removed: self.img_mgr.cache.discard(path)
+                if removed:
+                    print(f"磁盘缓存淘汰: {len(removed)} 个文件，{freed / 1048576:.1f} MB")
+            except Exception as e:
+                print(f"磁盘缓存淘汰失败: {e}")
+            await asyncio.sleep(self.disk_cache.EVICT_INTERVAL)
+
+    async def _spool_cleanup_loop(self):
+        await asyncio.to_thread(self._remove_legacy_temp_files)
+        while True:
+            await asyncio.to_thread(self.spool.cleanup)
+            await asyncio.sleep(300)
+
+    def _image_component(self, data, suffix=".png"):
+        # 默认直接以字节发送；适配器不支持字节图片时开启 send_images_as_file，写入临时目录后按文件发送。
+        # 是否支持要到适配器实际发送时才知道，这里无法捕获并自动回退，只能由配置决定
+        if not self.config.get("send_images_as_file", False):
+            return Comp.Image.fromBytes(data)
+        return Comp.Image.fromFileSystem(self.spool.write(data, suffix))
+
+    async def terminate(self):
+        for task in list(self._bg_tasks): task.cancel()
+        self.gif_gen.shutdown()
+        try:
+            await asyncio.to_thread(self.disk_cache.flush)
+        except Exception:
+            pass
+        await self.http.close()
+        await self.adb.close()
+
     def _safe_int(self, value, default, minimum=0):
         try:
             num = int(value)
@@ -689,6 +2248,14 @@ class CasePlugin(Star):
             num = default
         return max(minimum, num)
 
+    def _load_case_aliases(self):
+        # 配置格式：别名=容器全名，多个用逗号分隔
+        aliases = dict(CASE_ALIASES)
+        for pair in str(self.config.get("case_aliases", "") or "").replace("，", ",").split(","):
+            alias, sep, name = pair.partition("=")
+            if sep and alias.strip() and name.strip(): aliases[alias.strip()] = name.strip()
+        return aliases
+
     def _max_open_per_request(self) -> int:
         return self._safe_int(self.config.get("max_open_per_request", 50), 50, minimum=1)
 
@@ -721,9 +2288,9 @@ class CasePlugin(Star):
         elif any(k in case_name for k in ["胶囊", "涂鸦", "布章"]): return "capsule"
         return "case"
 
-    def _get_probability_map(self, items, case_name=""):
+    def _get_probability_map(self, qualities, case_name=""):
         if case_name.endswith("终端机"): return PROB_CATEGORY_15
-        qualities = set(i["rln"] for i in items if i.get("rln"))
+        qualities = set(q for q in qualities if q)
         if "军规级" in qualities and "消费级" not in qualities and "工业级" not in qualities:
              return PROB_CATEGORY_1
         if "消费级" in qualities:
@@ -735,69 +2302,70 @@ class CasePlugin(Star):
             return PROB_CATEGORY_3
         return PROB_CATEGORY_1
 
-    def _recalculate_probabilities(self, data):
-        for case_name, items in data.items():
-            prob_table = self._get_probability_map(items, case_name)
-            quality_counts = {}
-            for item in items:
-                q = item["rln"]
-                if q in prob_table: quality_counts[q] = quality_counts.get(q, 0) + 1
-            for item in items:
-                q = item["rln"]
-                if q in prob_table and quality_counts.get(q, 0) > 0:
-                    item["probability"] = prob_table[q] / quality_counts[q]
-                else: item["probability"] = 0
+    def _catalog_entry(self, case_name, rows):
+        # rows: [(short_name, rln, img), ...]；同一品质的物品平分该品质的掉落概率
+        qualities = [row[1] for row in rows]
+        prob_table = self._get_probability_map(qualities, case_name)
+        quality_counts = {}
+        for q in qualities:
+            if q in prob_table: quality_counts[q] = quality_counts.get(q, 0) + 1
+        probs = [prob_table[q] / quality_counts[q] if q in prob_table else 0 for q in qualities]
+        return case_name, rows, probs, self._identify_container_type(case_name)
+
+    def _build_catalog(self, case_data, case_images):
+        entries = [self._catalog_entry(name, rows) for name, rows in case_data.items()]
+        return Catalog(entries, case_images, self.case_aliases)
+
+    def _load_catalog(self):
+        # 优先读取磁盘快照（含预计算的概率与抽样表），版本不符时从数据库重建并写回快照
+        version = self.db.get_catalog_version()
+        catalog = Catalog.load_snapshot(CATALOG_SNAPSHOT_FILE, version, self.case_aliases)
+        if catalog is not None: return catalog
+        case_data, case_images = self.db.load_all_data()
+        catalog = self._build_catalog(case_data, case_images)
+        catalog.version = version
+        self._save_catalog_snapshot(catalog)
+        return catalog
+
+    def _save_catalog_snapshot(self, catalog):
+        try:
+            catalog.save_snapshot(CATALOG_SNAPSHOT_FILE, catalog.version, self.case_aliases)
+        except Exception as e:
+            print(f"目录快照写入失败: {e}")
 
-    def _generate_item(self, case_name):
-        items = self.case_data.get(case_name, [])
-        valid_items = [i for i in items if i.get("probability", 0) > 0]
-        if not valid_items: return {"name": "错误", "quality": "军规级", "wear_value": 0, "wear_level": "无", "img": "", "rln": "军规级", "short_name": "错误"}
-
-        ctype = self._identify_container_type(case_name)
-        rand = random.random()
-        cumulative = 0.0
-        selected_item = valid_items[-1]
-        
-        for item in valid_items:
-            cumulative += item["probability"]
-            if rand <= cumulative:
-                selected_item = item
-                break
-        
-        raw_name = selected_item["short_name"]
-        item_name = raw_name
-        quality = selected_item["rln"]
-        img = selected_item.get("img", "")
-        
-        if ctype == "souvenir": item_name = f"纪念品 | {item_name}"
-        elif ctype == "case":
-            if "手套" not in item_name and random.random() < 0.1:
-                item_name = f"StatTrak™ | {item_name}"
+    def _apply_catalog_changes(self, catalog, touched_cases, touched_imgs, removed):
+        # 基于旧目录构建新目录：只为变更的容器重算概率，其余容器直接复用旧目录中的概率
+        entries = [catalog.entry(n) for n in catalog.container_names if n not in removed and n not in touched_cases]
+        entries += [self._catalog_entry(n, rows) for n, rows in touched_cases.items()]
+        case_images = {n: v for n, v in catalog.case_images.items() if n not in removed}
+        case_images.update(touched_imgs)
+        return Catalog(entries, case_images, self.case_aliases)
 
-        is_doppler = "多普勒" in item_name
-        if is_doppler:
-            is_gamma = "伽玛" in item_name
-            type_pool = GAMMA_DOPPLER_PROBS if is_gamma else NORMAL_DOPPLER_PROBS
-            chosen_type = random.choices(list(type_pool.keys()), weights=list(type_pool.values()), k=1)[0]
-            item_name = item_name.replace("多普勒", f"多普勒 ({chosen_type})")
+    @property
+    def case_data(self):
+        return self.catalog.case_data
 
-        wear_config = DOPPLER_WEAR_LEVELS if is_doppler else WEAR_LEVELS
-        chosen_level = random.choices(wear_config, weights=[wl[1] for wl in wear_config], k=1)[0]
-        wear_val = round(random.uniform(chosen_level[2], chosen_level[3]), 8)
+    @property
+    def case_images(self):
+        return self.catalog.case_images
 
-        is_rare = quality in ["隐秘", "非凡", "Contraband"]
+    @property
+    def item_img_map(self):
+        return self.catalog.item_img_map
 
-        return {
-            "name": item_name,
-            "raw_name": raw_name,
-            "quality": quality,
-            "wear_value": wear_val,
-            "wear_level": chosen_level[0],
-            "template_id": random.randint(0, 999),
-            "img": img,
-            "is_special": is_rare,
-            "rln": quality
-        }
+    @property
+    def samplers(self):
+        return self.catalog.samplers
+
+    def generate_items(self, case_name, n):
+        sampler = self.samplers.get(case_name)
+        if not sampler or n <= 0: return None
+        return sampler.draw_batch(n)
+
+    def _generate_item(self, case_name):
+        batch = self.generate_items(case_name, 1)
+        if not batch: return {"name": "错误", "quality": "军规级", "wear_value": 0, "wear_level": "无", "img": "", "rln": "军规级", "short_name": "错误"}
+        return batch[0]
 
     def _parse_command(self, msg: str) -> tuple:
         clean_msg = msg.replace("开箱", "", 1).strip()
@@ -826,24 +2394,36 @@ class CasePlugin(Star):
 
     @event_message_type(EventMessageType.GROUP_MESSAGE)
     async def on_group_message(self, event: AstrMessageEvent):
+        self._start_background_tasks()
         msg = event.message_str.strip()
         if msg == "清除库存":
             async for r in self._handle_purge(event): yield r
-        elif msg == "清除缓存":
+        elif msg == "清除缓存" or msg.startswith("清除缓存 "):
             sender_id = str(event.get_sender_id())
             if sender_id in self.admins:
                 async for r in self._handle_clear_cache(event): yield r
             else:
                 yield event.plain_result("❌ 权限不足")
-        elif msg == "更新武器箱":
+        elif msg == "预热缓存":
+            sender_id = str(event.get_sender_id())
+            if sender_id in self.admins:
+                async for r in self._handle_prewarm(event): yield r
+            else:
+                yield event.plain_result("❌ 权限不足")
+        elif msg == "缓存状态":
+            sender_id = str(event.get_sender_id())
+            if sender_id in self.admins:
+                async for r in self._handle_cache_stats(event): yield r
+            else:
+                yield event.plain_result("❌ 权限不足")
+        elif msg == "更新武器箱" or msg.startswith("更新武器箱 "):
             sender_id = str(event.get_sender_id())
             if sender_id in self.admins:
                 async for r in self._handle_update_cases(event): yield r
             else:
                 yield event.plain_result(f"❌ 权限不足：仅管理员可更新数据。")
         elif msg == "开箱菜单":
-            img_bytes = self.gif_gen.generate_help_card()
-            yield event.chain_result([Comp.Image.fromBytes(img_bytes)])
+            async for r in self._show_menu(event): yield r
         elif msg == "武器箱列表":
             async for r in self._handle_show_list(event): yield r
         elif msg == "库存":
@@ -853,82 +2433,238 @@ class CasePlugin(Star):
         elif msg.startswith("查询价格"):
             async for r in self._handle_price_query(event): yield r
 
+    # 不带参数的 清除缓存 只清理超过该天数未使用的图片
+    DEFAULT_PURGE_DAYS = 7
+
     async def _handle_clear_cache(self, event):
+        arg = event.message_str.strip()[len("清除缓存"):].strip()
+        if arg == "全部":
+            mode, days, desc = "all", 0, "全部图片"
+        elif arg == "缩略图":
+            mode, days, desc = "derived", 0, "缩略图"
+        elif not arg or arg.isdigit():
+            days = int(arg) if arg else self.DEFAULT_PURGE_DAYS
+            mode, desc = "unused", f"{days} 天未使用的图片"
+        else:
+            yield event.plain_result("❌ 用法：清除缓存 [天数|缩略图|全部]")
+            return
         try:
-            count = 0
-            if os.path.exists(IMAGES_DIR):
-                count = len(os.listdir(IMAGES_DIR))
-                shutil.rmtree(IMAGES_DIR) 
-            os.makedirs(IMAGES_DIR, exist_ok=True) 
-            yield event.plain_result(f"✅ 缓存已清除！释放了 {count} 个文件。\n下次开箱将会重新下载图片。")
+            removed, freed = await asyncio.to_thread(self.disk_cache.purge, mode, days)
+            if mode == "all":
+                self.img_mgr.cache.clear()
+                self.render_cache.clear()
+            else:
+                for path in removed: self.img_mgr.cache.discard(path)
+            yield event.plain_result(f"✅ 已清理{desc}：{len(removed)} 个文件，释放 {freed / 1048576:.1f} MB。")
         except Exception as e:
             yield event.plain_result(f"❌ 清除失败: {e}")
 
-    async def _handle_update_cases(self, event: AstrMessageEvent):
-        yield event.plain_result("⏳ 开始同步数据 (限制频率 1.5s/次)...")
+    async def _handle_cache_stats(self, event):
+        st = self.img_mgr.cache.stats()
+        rst = self.render_cache.stats()
+        dst = await asyncio.to_thread(self.disk_cache.stats)
+        disk_limit = f"{dst['max_bytes'] / 1048576:.0f} MB" if dst['max_bytes'] else "不限"
+        lookups = st['hits'] + st['misses']
+        hit_rate = f"{st['hits'] / lookups:.1%}" if lookups else "-"
+        yield event.plain_result(
+            f"🧠 图片内存缓存\n"
+            f"占用: {st['bytes'] / 1048576:.1f} / {st['max_bytes'] / 1048576:.0f} MB ({st['entries']} 张)\n"
+            f"命中: {st['hits']} | 未命中: {st['misses']} | 命中率: {hit_rate}\n"
+            f"淘汰: {st['evictions']}\n"
+            f"🖼️ 渲染结果缓存\n"
+            f"占用: {rst['bytes'] / 1048576:.1f} / {rst['max_bytes'] / 1048576:.0f} MB ({rst['entries']} 项)\n"
+            f"命中: {rst['hits']} | 未命中: {rst['misses']}\n"
+            f"💾 磁盘图片缓存\n"
+            f"占用: {dst['bytes'] / 1048576:.1f} MB / {disk_limit} ({dst['files']} 个文件)\n"
+            f"已淘汰: {dst['evicted_files']} 个文件，{dst['evicted_bytes'] / 1048576:.1f} MB"
+        )
+
+    def _prewarm_targets(self):
+        # (url, 派生尺寸, 重采样)：物品预生成滚动条尺寸，封面预生成 180px 宽缩略图
+        strip_size = (self.gif_gen.BASE_ITEM_SIZE, self.gif_gen.BASE_ITEM_SIZE)
+        targets = {}
+        for items in self.case_data.values():
+            for item in items:
+                if item.get("img"): targets.setdefault(item["img"], (strip_size, "bicubic"))
+        for url in self.case_images.values():
+            if url: targets[url] = ((180, 0), "lanczos")
+        # 已存在派生图的条目直接跳过，因此中断后再次执行会从上次的位置继续
+        return [(url, size, resample) for url, (size, resample) in sorted(targets.items())
+                if not os.path.exists(self.img_mgr._get_derived_path(url, size, resample))]
+
+    def _start_prewarm(self):
+        if self._prewarm_task and not self._prewarm_task.done(): return False
+        self._prewarm_task = self._spawn_background(self._prewarm_images())
+        return True
+
+    async def _prewarm_images(self):
+        targets = await asyncio.to_thread(self._prewarm_targets)
+        state = {"total": len(targets), "done": 0, "failed": 0, "started_at": time.time(), "finished": False}
+        self._prewarm_state = state
+        rate = self._safe_int(self.config.get("prewarm_rate", 5), 5, minimum=1)
+        bucket = TokenBucket(rate, burst=rate)
+
+        async def fetch(url, size, resample):
+            await bucket.acquire()
+            img = await self.img_mgr.get_thumbnail(url, size, resample)
+            state["done" if img is not None else "failed"] += 1
+
+        # 分批提交，避免一次性创建数千个协程；单次下载并发由 ImageManager 的信号量限制
+        batch = 64
+        for i in range(0, len(targets), batch):
+            await asyncio.gather(*(fetch(*t) for t in targets[i:i + batch]))
+            print(f"缓存预热: {state['done'] + state['failed']}/{state['total']}")
+        state["finished"] = True
+        print(f"缓存预热完成: 成功 {state['done']}，失败 {state['failed']}")
+
+    async def _handle_prewarm(self, event):
+        if self._prewarm_task and not self._prewarm_task.done():
+            st = self._prewarm_state
+            processed = st.get("done", 0) + st.get("failed", 0)
+            yield event.plain_result(f"⏳ 预热进行中: {processed}/{st.get('total', 0)}（失败 {st.get('failed', 0)}）")
+            return
+        self._start_prewarm()
+        yield event.plain_result("🔥 已在后台开始预热图片缓存，再次发送“预热缓存”可查看进度。")
+
+    def _clean_container_items(self, raw):
+        cleaned = []
+        seen = set()
+        for item in raw:
+            rln = item.get("rln")
+            s_name = item.get("short_name")
+            if rln not in ALL_QUALITIES: continue
+            if s_name in seen: continue
+            if "（★）" in s_name: rln = "非凡"
+            seen.add(s_name)
+            cleaned.append({"short_name": s_name, "rln": rln, "img": item.get("img")})
+        return cleaned
+
+    async def _fetch_container_list(self):
         url = f"https://{self.api_host}/api/v1/info/container_data_info"
+        list_resp = await self.net_mgr.request(url, method="POST")
+        if not list_resp or list_resp.get("code") != 200:
+            raise RuntimeError(f"获取列表失败: {list_resp}")
+        containers = []
+        for c in list_resp.get("data", []):
+            name = c['name']
+            if any(k in name for k in ["胶囊", "涂鸦", "布章"]): continue
+            if name.endswith("挂件") or name.endswith("印花"): continue
+            containers.append((c['id'], name, c.get("img") or ""))
+        return containers
+
+    async def _sync_containers(self, run_id, pending):
+        concurrency = self._safe_int(self.config.get("sync_concurrency", 3), 3, minimum=1)
         try:
-            list_resp = self.net_mgr.request(url, method="POST")
-        except Exception as e:
-            yield event.plain_result(f"❌ 列表请求异常: {e}")
-            return
+            rate = float(self.config.get("sync_rate", 0.6))
+        except Exception:
+            rate = 0.6
+        bucket = TokenBucket(rate, burst=concurrency)
+        sem = asyncio.Semaphore(concurrency)
+        progress = {"done": 0, "failed": 0}
+
+        async def fetch_one(container_id, name):
+            async with sem:
+                await bucket.acquire()
+                detail_url = f"https://{self.api_host}/api/v1/info/good/container_detail?id={container_id}"
+                try:
+                    detail = await self.net_mgr.request(detail_url)
+                except Exception as e:
+                    print(f"同步 {name} 失败: {e}")
+                    await self.adb.stage_container(run_id, name, None)
+                    progress["failed"] += 1
+                    return
+                # 限流或上游错误同样视为失败，否则该容器会以空列表暂存并在保存时被删除
+                if not detail or detail.get("code") != 200:
+                    print(f"同步 {name} 失败: {detail}")
+                    await self.adb.stage_container(run_id, name, None)
+                    progress["failed"] += 1
+                    return
+                items = self._clean_container_items(detail.get("data", []))
+                await self.adb.stage_container(run_id, name, items)
+                progress["done"] += 1
+                processed = progress["done"] + progress["failed"]
+                if processed % 10 == 0: print(f"同步: {processed}/{len(pending)}")
+
+        await asyncio.gather(*(fetch_one(cid, name) for cid, name, _ in pending))
+        return progress
+
+    # 超过该天数仍未完成的同步不再续传，重新获取容器列表
+    SYNC_RUN_MAX_AGE_DAYS = 3
 
-        if not list_resp or list_resp.get("code") != 200:
-            yield event.plain_result(f"❌ 获取列表失败: {list_resp}")
+    async def _handle_update_cases(self, event: AstrMessageEvent):
+        arg = event.message_str.strip()[len("更新武器箱"):].strip()
+        if arg and arg != "重新开始":
+            yield event.plain_result("❌ 用法：更新武器箱 [重新开始]")
             return
-        
-        containers = list_resp.get("data", [])
-        total = len(containers)
-        new_cases = {}
-        new_imgs = {}
-        success = 0
-        
+        if self._sync_running:
+            yield event.plain_result("⏳ 已有同步任务在进行中，请稍候")
+            return
+        self._sync_running = True
         try:
-            for idx, c in enumerate(containers):
-                name = c['name']
-                if any(k in name for k in ["胶囊", "涂鸦", "布章"]): continue
-                if name.endswith("挂件") or name.endswith("印花"): continue
-                
-                if c.get("img"): new_imgs[name] = c['img']
-                detail_url = f"https://{self.api_host}/api/v1/info/good/container_detail?id={c['id']}"
-                detail = self.net_mgr.request(detail_url)
-
-                if detail and detail.get("code") == 200:
-                    raw = detail.get("data", [])
-                    cleaned = []
-                    seen = set()
-                    for item in raw:
-                        rln = item.get("rln")
-                        s_name = item.get("short_name")
-                        if rln not in ALL_QUALITIES: continue
-                        if s_name in seen: continue
-                        if "（★）" in s_name: rln = "非凡"
-                        seen.add(s_name)
-                        cleaned.append({"short_name": s_name, "rln": rln, "img": item.get("img")})
-                    if cleaned:
-                        new_cases[name] = cleaned
-                        success += 1
-                
-                if idx % 10 == 0: print(f"同步: {idx}/{total}")
-                await asyncio.sleep(1.5)
-                
-            if self.db.save_all_data(new_cases, new_imgs):
-                self.case_data, self.case_images, self.item_img_map = self.db.load_all_data()
-                self._recalculate_probabilities(self.case_data)
-                yield event.plain_result(f"✅ 更新完毕！收录 {success} 个容器。")
+            now = datetime.now()
+            now_text = now.strftime("%Y-%m-%d %H:%M:%S")
+            active = await self.adb.get_active_sync()
+            run_id = None
+            if active is not None:
+                run_id, started_at = active
+                try:
+                    expired = now - datetime.strptime(started_at, "%Y-%m-%d %H:%M:%S") > timedelta(days=self.SYNC_RUN_MAX_AGE_DAYS)
+                except Exception:
+                    expired = True
+                if arg == "重新开始" or expired:
+                    await self.adb.abandon_sync(run_id, now_text)
+                    run_id = None
+            if run_id is None:
+                try:
+                    containers = await self._fetch_container_list()
+                except Exception as e:
+                    yield event.plain_result(f"❌ 列表请求异常: {e}")
+                    return
+                run_id = await self.adb.start_sync(containers, now_text)
+                yield event.plain_result(f"⏳ 开始同步 {len(containers)} 个容器...")
+            else:
+                st = await self.adb.get_sync_progress(run_id)
+                yield event.plain_result(f"⏳ 继续上次未完成的同步（已完成 {st.get('done', 0)}/{sum(st.values())}）...")
+
+            pending = await self.adb.pending_sync_containers(run_id)
+            progress = await self._sync_containers(run_id, pending)
+            if progress["failed"]:
+                yield event.plain_result(f"⚠️ 有 {progress['failed']} 个容器同步失败，已保存进度，再次发送“更新武器箱”将继续重试；若始终失败，可发送“更新武器箱 重新开始”放弃本次进度并重新获取列表。")
+                return
+
+            new_cases, new_imgs = await self.adb.load_staged(run_id)
+            changes = await self.adb.save_all_data(new_cases, new_imgs)
+            if changes is not None:
+                changed, removed = changes
+                await self.adb.finish_sync(run_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                touched_cases, touched_imgs = await self.adb.load_containers(changed)
+                new_catalog = await asyncio.to_thread(self._apply_catalog_changes, self.catalog, touched_cases, touched_imgs, removed)
+                new_catalog.version = await self.adb.get_catalog_version()
+                self.catalog = new_catalog
+                if changed or removed:
+                    await asyncio.to_thread(self._save_catalog_snapshot, self.catalog)
+                yield event.plain_result(f"✅ 更新完毕！收录 {len(new_cases)} 个容器（变更 {len(changed)}，移除 {len(removed)}）。")
             else:
                 yield event.plain_result("❌ 数据库写入失败")
         except Exception as e:
             import traceback
             traceback.print_exc()
-            yield event.plain_result(f"❌ 中断: {e}")
+            yield event.plain_result(f"❌ 中断: {e}（进度已保存，可再次发送“更新武器箱”继续）")
+        finally:
+            self._sync_running = False
 
     async def _handle_show_list(self, event):
-        if not self.case_data:
+        catalog = self.catalog
+        if not catalog.case_data:
             yield event.plain_result("❌ 无数据，请先更新")
             return
+        async def render():
+            return self._format_case_list(catalog)
+        yield event.plain_result(await self._render_cached("list", None, catalog.version, render))
+
+    def _format_case_list(self, catalog):
         cases, souvenirs, collections = [], [], []
-        for n in sorted(self.case_data.keys()):
+        for n in sorted(catalog.case_data.keys()):
             t = self._identify_container_type(n)
             if t == "souvenir": souvenirs.append(n)
             elif t == "collection": collections.append(n)
@@ -937,7 +2673,16 @@ class CasePlugin(Star):
             lines = []
             for i in range(0, len(items), 2): lines.append(" | ".join(items[i:i+2]))
             return "\n".join(lines) if items else "(无)"
-        yield event.plain_result(f"📦 武器箱 ({len(cases)}):\n{fmt(cases)}\n\n🎁 纪念包 ({len(souvenirs)}):\n{fmt(souvenirs)}\n\n🖼️ 收藏品 ({len(collections)}):\n{fmt(collections)}")
+        return f"📦 武器箱 ({len(cases)}):\n{fmt(cases)}\n\n🎁 纪念包 ({len(souvenirs)}):\n{fmt(souvenirs)}\n\n🖼️ 收藏品 ({len(collections)}):\n{fmt(collections)}"
+
+    async def _render_cover(self, case_img_url):
+        img_small = await self.img_mgr.get_thumbnail(case_img_url, (180, 0), "lanczos")
+        if img_small is None: return None
+        def encode():
+            output = BytesIO()
+            img_small.save(output, format="PNG")
+            return output.getvalue()
+        return await asyncio.to_thread(encode)
 
     async def _handle_open(self, event: AstrMessageEvent):
         msg = event.message_str.strip()
@@ -952,17 +2697,25 @@ class CasePlugin(Star):
             yield event.plain_result(f"❌ 单次开箱上限为 {max_per_request}，请调整数量")
             return
 
-        target_case = None
-        if case_name in self.case_data:
-            target_case = case_name
+        # 固定本次开箱使用的目录快照，期间即使后台更新替换了目录也不受影响
+        catalog = self.catalog
+        if case_name in catalog.case_data:
+            matches = [case_name]
         else:
-            for name in self.case_data.keys():
-                if case_name in name:
-                    target_case = name
-                    break
-        if not target_case:
+            matches = catalog.name_index.lookup(case_name)
+        if not matches:
             yield event.plain_result(f"❌ 未找到【{case_name}】")
             return
+        if len(matches) > 1:
+            lines = [f"🔍 【{case_name}】匹配到 {len(matches)} 个容器，请输入更完整的名称："]
+            lines += [f"{i}. {name}" for i, name in enumerate(matches[:10], 1)]
+            if len(matches) > 10: lines.append(f"……等 {len(matches)} 个")
+            yield event.plain_result("\n".join(lines))
+            return
+        target_case = matches[0]
+        if not catalog.samplers.get(target_case):
+            yield event.plain_result(f"❌ 【{target_case}】暂无可开启的物品")
+            return
 
         user_id = str(event.get_sender_id())
         group_id = str(event.message_obj.group_id)
@@ -973,10 +2726,12 @@ class CasePlugin(Star):
         now_text = now_dt.strftime("%Y-%m-%d %H:%M:%S")
 
         count = requested_count
-        allowed_count, used_today, remaining_today = self.db.consume_daily_quota(
+        # 在扣减额度的同一事务内按可用额度抽取，额度用尽时不会白白抽取
+        items_res, allowed_count, used_today, remaining_today, total_count = await self.adb.record_open_batch(
             user_key=user_key,
-            period_key=period_key,
+            draw=catalog.samplers[target_case].draw_batch,
             request_count=count,
+            period_key=period_key,
             daily_limit=max_per_day,
             now_text=now_text,
         )
@@ -994,44 +2749,26 @@ class CasePlugin(Star):
 
         count = allowed_count
 
-        items_res = []
-        for _ in range(count):
-            item = self._generate_item(target_case)
-            items_res.append(item)
-            self.db.add_item(user_key, item)
-
-        user_stats = self.db.get_user_stats(user_key)
-        total_count = user_stats['total']
-
         if count == 1:
             winner = items_res[0]
             chain = [Comp.At(qq=user_id)]
             chain.append(Comp.Plain(f" 【{target_case}】开启结果\n"))
 
-            case_img_url = self.case_images.get(target_case)
+            case_img_url = catalog.case_images.get(target_case)
             if case_img_url:
                 try:
-                    img_obj = await self.img_mgr.get_image(case_img_url)
-                    if img_obj:
-                        base_width = 180
-                        w_percent = (base_width / float(img_obj.size[0]))
-                        h_size = int((float(img_obj.size[1]) * float(w_percent)))
-                        img_small = img_obj.resize((base_width, h_size), Image.Resampling.LANCZOS)
-
-                        temp_cover_path = os.path.join(IMAGES_DIR, f"cover_{user_id}.png")
-                        img_small.save(temp_cover_path)
-                        chain.append(Comp.Image.fromFileSystem(temp_cover_path))
+                    cover_bytes = await self._render_cached("cover", target_case, catalog.version,
+                                                            lambda: self._render_cover(case_img_url))
+                    if cover_bytes:
+                        chain.append(self._image_component(cover_bytes))
                 except Exception as e:
                     print(f"封面图处理失败: {e}")
 
             try:
-                all_possible_items = self.case_data[target_case]
+                all_possible_items = catalog.case_data[target_case]
                 gif_bytes = await self.gif_gen.generate(winner, all_possible_items)
 
-                temp_gif_path = os.path.join(IMAGES_DIR, f"temp_{user_id}.gif")
-                with open(temp_gif_path, "wb") as f:
-                    f.write(gif_bytes)
-                chain.append(Comp.Image.fromFileSystem(temp_gif_path))
+                chain.append(self._image_component(gif_bytes, ".gif"))
             except Exception as e:
                 print(f"GIF生成失败: {e}")
                 if winner.get("img"):
@@ -1056,21 +2793,18 @@ class CasePlugin(Star):
             best_score = -1
             score_map = {"非凡": 10, "Contraband": 9, "隐秘": 8}
 
-            for item in items_res:
-                score = score_map.get(item['quality'], 0)
+            for row in range(len(items_res)):
+                score = score_map.get(items_res.quality(row), 0)
                 if score > best_score:
                     best_score = score
-                    best_item = item
+                    best_item = items_res[row]
 
             if best_item and best_score > 0:
                 chain.append(Comp.Plain(" ✨ 欧气爆发！开出了稀有物品！\n"))
                 try:
-                    all_possible_items = self.case_data[target_case]
+                    all_possible_items = catalog.case_data[target_case]
                     gif_bytes = await self.gif_gen.generate(best_item, all_possible_items)
-                    temp_gif_path = os.path.join(IMAGES_DIR, f"temp_rare_{user_id}.gif")
-                    with open(temp_gif_path, "wb") as f:
-                        f.write(gif_bytes)
-                    chain.append(Comp.Image.fromFileSystem(temp_gif_path))
+                    chain.append(self._image_component(gif_bytes, ".gif"))
                 except:
                     pass
 
@@ -1085,12 +2819,8 @@ class CasePlugin(Star):
                         info += f"🔧 {item['wear_level']} ({item['wear_value']:.5f})\n"
                     chain.append(Comp.Plain(info))
             else:
-                stats = {}
-                rare = []
-                for item in items_res:
-                    stats[item['quality']] = stats.get(item['quality'], 0) + 1
-                    if item.get("is_special") or item['quality'] in ["隐秘", "非凡", "Contraband"]:
-                        rare.append(item)
+                stats = items_res.quality_counts()
+                rare = [items_res[row] for row in items_res.rare_rows()]
 
                 chain.append(Comp.Plain("\n📊 统计结果：\n"))
                 for q, c in stats.items():
@@ -1114,12 +2844,18 @@ class CasePlugin(Star):
 
     async def _handle_purge(self, event):
         uid = f"{event.message_obj.group_id}-{event.get_sender_id()}"
-        self.db.clear_user_history(uid)
+        await self.adb.clear_user_history(uid)
         yield event.plain_result("✅ 库存已清空")
 
     async def _show_inventory(self, event):
         uid = f"{event.message_obj.group_id}-{event.get_sender_id()}"
-        inv = self.db.get_user_stats(uid)
+        # 先取版本号再读数据：期间若有新写入，缓存会记在旧版本号下，下次查询自然失效
+        version = self.adb.user_version(uid)
+        cached = self.render_cache.get_render(("inv", uid), version)
+        if cached is not None:
+            yield event.chain_result([Comp.At(qq=event.get_sender_id()), self._image_component(cached)])
+            return
+        inv = await self.adb.get_user_stats(uid)
         
         if inv['total'] == 0: 
             yield event.plain_result("📭 空空如也")
@@ -1127,9 +2863,8 @@ class CasePlugin(Star):
             
         try:
             img_bytes = await self.gif_gen.generate_inventory_card(inv, self.item_img_map)
-            temp_path = os.path.join(IMAGES_DIR, f"inv_{uid}.png")
-            with open(temp_path, "wb") as f: f.write(img_bytes)
-            yield event.chain_result([Comp.At(qq=event.get_sender_id()), Comp.Image.fromFileSystem(temp_path)])
+            self.render_cache.put_render(("inv", uid), version, img_bytes)
+            yield event.chain_result([Comp.At(qq=event.get_sender_id()), self._image_component(img_bytes)])
         except Exception as e:
             print(f"库存图片生成失败: {e}")
             import traceback
@@ -1141,41 +2876,135 @@ class CasePlugin(Star):
                 for item in inv['items']: msg.append(f"* {item['name']}")
             yield event.plain_result("\n".join(msg))
 
+    async def _render_cached(self, kind, key, version, render):
+        # render 为返回字节（或 None）的协程函数；None 不缓存，下次重新渲染
+        data = self.render_cache.get_render((kind, key), version)
+        if data is None:
+            data = await render()
+            if data is not None: self.render_cache.put_render((kind, key), version, data)
+        return data
+
     async def _show_menu(self, event):
-        img_bytes = self.gif_gen.generate_help_card()
-        yield event.chain_result([Comp.Image.fromBytes(img_bytes)])
+        img_bytes = await self._render_cached("help", None, self.gif_gen.HELP_CARD_VERSION,
+                                              lambda: asyncio.to_thread(self.gif_gen.generate_help_card))
+        yield event.chain_result([self._image_component(img_bytes)])
 
-    def _http_request(self, path, method="GET"):
-        return self.net_mgr.request(f"https://{self.api_host}{path}", method=method)
+    async def _http_request(self, path, method="GET"):
+        return await self.net_mgr.request(f"https://{self.api_host}{path}", method=method)
     
-    def search_items(self, keyword):
-        d = self._http_request(f"/api/v1/search/suggest?text={quote(keyword)}")
-        return d.get('data', []) if d and d.get('code')==200 else None
-
-    def get_goods_info(self, gid):
-        time.sleep(1.5)
-        d = self._http_request(f"/api/v1/info/good?id={gid}")
-        if not d or d.get('code')!=200: return None
-        g = d['data']['goods_info']
+    async def search_items(self, keyword):
+        async def fetch():
+            d = await self._http_request(f"/api/v1/search/suggest?text={quote(keyword)}")
+            return d.get('data', []) if d and d.get('code')==200 else None
+        # 搜索联想结果基本不随价格变化，缓存时间取价格 TTL 的 6 倍
+        return await self.price_cache.get("search", keyword, self.price_ttl * 6, fetch)
+
+    async def get_goods_info(self, gid):
+        async def fetch():
+            d = await self._http_request(f"/api/v1/info/good?id={gid}")
+            if not d or d.get('code')!=200: return None
+            g = d['data']['goods_info']
+            return {
+                "名称": g['name'], 
+                "BUFF": g['buff_sell_price'], 
+                "YYYP": g.get('yyyp_sell_price', '无'),
+                "Steam": g['steam_sell_price'], 
+                "img": g['img'], 
+                "更新": g['updated_at']
+            }
+        return await self.price_cache.get("goods", str(gid), self.price_ttl, fetch)
+
+    def _mirror_row(self, short_name, info, fetched_at):
         return {
-            "名称": g['name'], 
-            "BUFF": g['buff_sell_price'], 
-            "YYYP": g.get('yyyp_sell_price', '无'),
-            "Steam": g['steam_sell_price'], 
-            "img": g['img'], 
-            "更新": g['updated_at']
+            "short_name": short_name, "goods_id": str(info.get("id", "")), "name": info["名称"],
+            "buff": info["BUFF"], "yyyp": info["YYYP"], "steam": info["Steam"],
+            "img_url": info["img"], "source_updated_at": info["更新"], "fetched_at": fetched_at,
         }
 
-    def get_price(self, name):
-        items = self.search_items(name)
-        if not items: return "❌ 未找到"
-        info = self.get_goods_info(items[0]['id'])
-        if not info: return "❌ 详情获取失败"
-        return f"{info['img']}\n{info['名称']}\nBUFF: {info['BUFF']} | YYYP: {info['YYYP']}\nSteam: {info['Steam']}"
+    def _format_price(self, row, now=None):
+        text = f"{row['img_url']}\n{row['name']}\nBUFF: {row['buff']} | YYYP: {row['yyyp']}\nSteam: {row['steam']}"
+        if now is None: return text
+        age = max(0, now - row["fetched_at"])
+        if age < 3600: ago = f"{int(age // 60)} 分钟前"
+        elif age < 172800: ago = f"{int(age // 3600)} 小时前"
+        else: ago = f"{int(age // 86400)} 天前"
+        if age > self.price_max_age:
+            return text + f"\n⚠️ 价格可能已过期（{ago}同步，实时查询失败）"
+        return text + f"\n🕒 本地价格 · {ago}同步"
+
+    async def _fetch_price_upstream(self, keyword):
+        items = await self.search_items(keyword)
+        if not items: return None, "❌ 未找到"
+        gid = items[0]['id']
+        info = await self.get_goods_info(gid)
+        if not info: return None, "❌ 详情获取失败"
+        return dict(info, id=gid), None
+
+    async def get_price(self, name):
+        # 优先使用本地价格镜像；过期或未收录时请求 API，API 失败时退回过期数据并提示
+        local = await self.adb.search_price_mirror(name)
+        now = time.time()
+        if local and now - local["fetched_at"] <= self.price_max_age:
+            try:
+                await self.adb.touch_price_query(local["short_name"], now)
+            except Exception as e:
+                print(f"价格镜像写入失败: {e}")
+            return self._format_price(local, now)
+        try:
+            info, err = await self._fetch_price_upstream(local["short_name"] if local else name)
+        except Exception as e:
+            if not local: raise
+            print(f"价格查询失败，使用本地数据: {e}")
+            info, err = None, "❌ 查询失败"
+        if not info:
+            return self._format_price(local, now) if local else err
+        # 商品名去掉磨损后缀即为目录中的 short_name，命中时顺带写入本地镜像
+        short_name = local["short_name"] if local else re.sub(r"\s*[（(][^（）()]*[)）]$", "", info["名称"])
+        if short_name in self.item_img_map:
+            try:
+                await self.adb.upsert_price_mirror([dict(self._mirror_row(short_name, info, now), queried_at=now)])
+            except Exception as e:
+                print(f"价格镜像写入失败: {e}")
+        return self._format_price({"img_url": info["img"], "name": info["名称"], "buff": info["BUFF"], "yyyp": info["YYYP"], "steam": info["Steam"]})
+
+    async def _price_sync_loop(self):
+        interval = self._safe_int(self.config.get("price_sync_interval", 0), 0, minimum=1) * 60
+        await asyncio.sleep(60)
+        while True:
+            try:
+                await self._sync_prices()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"价格同步失败: {e}")
+            await asyncio.sleep(interval)
+
+    # 后台同步只刷新最近这么多天内被查询过的物品，不会遍历整个目录
+    PRICE_SYNC_RECENT_DAYS = 7
+
+    async def _sync_prices(self):
+        # 逐个刷新近期被查询过且已过期的价格；请求经 PriceCache 的令牌桶限速，与用户查询共用配额
+        now = time.time()
+        names = await self.adb.stale_price_names(now - self.price_max_age, now - self.PRICE_SYNC_RECENT_DAYS * 86400)
+        if not names: return
+        rows, done = [], 0
+        for short_name in names:
+            try:
+                info, _ = await self._fetch_price_upstream(short_name)
+            except Exception:
+                info = None
+            if info:
+                rows.append(self._mirror_row(short_name, info, time.time()))
+                done += 1
+            if len(rows) >= 50:
+                await self.adb.upsert_price_mirror(rows)
+                rows = []
+        if rows: await self.adb.upsert_price_mirror(rows)
+        print(f"价格同步完成: {done}/{len(names)}")
 
     async def _handle_price_query(self, event):
         name = event.message_str.replace("查询价格","").strip()
-        res = self.get_price(name)
+        res = await self.get_price(name)
         if "http" in res:
             p = res.split('\n',1)
             yield event.chain_result([Comp.At(qq=event.get_sender_id()), Comp.Image.fromURL(p[0]), Comp.Plain("\n"+p[1])])
@@ -0,0 +1,22 @@
+import pytest
+
+import support
+
+
+@pytest.fixture
+def make_plugin(tmp_path):
+    plugins = []
+
+    def factory(config=None):
+        plugin = support.make_plugin(str(tmp_path), config)
+        plugins.append(plugin)
+        return plugin
+
+    yield factory
+    for plugin in plugins:
+        support.close_plugin(plugin)
+
+
+@pytest.fixture
+def plugin(make_plugin):
+    return make_plugin()
@@ -0,0 +1 @@
+# 测试用的最小化 AstrBot 接口桩，仅在未安装 AstrBot 时由 tests/support.py 加入 sys.path
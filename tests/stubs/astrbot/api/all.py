@@ -0,0 +1,36 @@
+__all__ = ["Context", "Star", "EventMessageType", "AstrMessageEvent", "register", "event_message_type"]
+
+
+class Context:
+    pass
+
+
+class Star:
+    def __init__(self, context): self.context = context
+
+
+class EventMessageType:
+    GROUP_MESSAGE = 1
+
+
+class _MessageObj:
+    def __init__(self, group_id): self.group_id = group_id
+
+
+class AstrMessageEvent:
+    def __init__(self, message_str, sender_id="1", group_id="100"):
+        self.message_str = message_str
+        self._sender_id = sender_id
+        self.message_obj = _MessageObj(group_id)
+
+    def get_sender_id(self): return self._sender_id
+    def plain_result(self, text): return ("plain", text)
+    def chain_result(self, chain): return ("chain", chain)
+
+
+def register(*args, **kwargs):
+    return lambda cls: cls
+
+
+def event_message_type(message_type):
+    return lambda func: func
@@ -0,0 +1,22 @@
+class _Component:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class Image(_Component):
+    @classmethod
+    def fromBytes(cls, data): return cls(bytes=data)
+
+    @classmethod
+    def fromFileSystem(cls, path): return cls(path=path)
+
+    @classmethod
+    def fromURL(cls, url): return cls(url=url)
+
+
+class Plain(_Component):
+    def __init__(self, text): super().__init__(text=text)
+
+
+class At(_Component):
+    pass
@@ -0,0 +1,2 @@
+class StarTools:
+    pass
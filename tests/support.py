@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIPPED_DB = os.path.join(ROOT, "data", "data.db")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+# 未安装 AstrBot 时把 tests/stubs 中的最小化接口桩加入 sys.path。
+# 桩以磁盘上的包提供而不是只写入 sys.modules，这样 spawn 出的渲染子进程继承 sys.path 后也能导入 main
+STUB_DIR = os.path.join(ROOT, "tests", "stubs")
+
+
+def install_astrbot_stub():
+    try:
+        import astrbot.api.all  # noqa: F401
+    except ImportError:
+        sys.path.insert(0, STUB_DIR)
+
+
+install_astrbot_stub()
+import main  # noqa: E402
+
+
+def isolate_data_dir(path, seed_db=True):
+    # 把插件的数据目录指向 path，并复制随插件附带的 data.db，避免测试改写仓库中的数据库
+    data_dir = os.path.join(path, "data")
+    main.DATA_DIR = data_dir
+    main.IMAGES_DIR = os.path.join(data_dir, "images")
+    main.SPOOL_DIR = os.path.join(data_dir, "spool")
+    main.DB_FILE = os.path.join(data_dir, "data.db")
+    main.CATALOG_SNAPSHOT_FILE = os.path.join(data_dir, "catalog.pickle")
+    main.OLD_HISTORY_FILE = os.path.join(path, "open_history.json")
+    main.OLD_HISTORY_FILE_IN_DATA = os.path.join(data_dir, "open_history.json")
+    os.makedirs(main.IMAGES_DIR, exist_ok=True)
+    if seed_db and not os.path.exists(main.DB_FILE):
+        shutil.copy(SHIPPED_DB, main.DB_FILE)
+    return data_dir
+
+
+def make_plugin(path, config=None):
+    isolate_data_dir(path)
+    return main.CasePlugin(None, dict(config or {}))
+
+
+async def run_command(plugin, message, sender_id="1", group_id="100"):
+    event = main.AstrMessageEvent(message, sender_id, group_id)
+    return [r async for r in plugin.on_group_message(event)]
+
+
+def fake_png(url, size=(512, 384)):
+    # 按 URL 生成确定性的测试图片，代替从 CDN 下载
+    main._load_pil()
+    rnd = random.Random(url)
+    img = main.Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = main.ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+        draw.ellipse([x - 60, y - 40, x + 60, y + 40],
+                     fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), 255))
+    return img
+
+
+def seed_images(urls):
+    for url in urls:
+        if not url: continue
+        path = os.path.join(main.IMAGES_DIR, hashlib.md5(url.encode()).hexdigest() + ".png")
+        if not os.path.exists(path):
+            fake_png(url).save(path)
+
+
+def close_plugin(plugin):
+    asyncio.run(plugin.terminate())
@@ -0,0 +1,46 @@
+import asyncio
+
+import support
+
+
+def _snapshot(db, user_key):
+    with db._read() as c:
+        rare = dict(c.execute("SELECT quality, count FROM user_rare_stats WHERE user_key=?", (user_key,)).fetchall())
+        total = c.execute("SELECT total FROM user_totals WHERE user_key=?", (user_key,)).fetchone()
+    return rare, total[0] if total else 0
+
+
+def test_incremental_aggregates_match_rebuild(make_plugin):
+    plugin = make_plugin({"number": 5})
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    for uid in ("7", "8"):
+        for _ in range(3):
+            asyncio.run(support.run_command(plugin, f"开箱 50 {case_name}", uid))
+    db = plugin.db
+    before = {k: _snapshot(db, k) for k in ("100-7", "100-8")}
+    with db._write() as c:
+        db._rebuild_aggregates(c)
+    assert {k: _snapshot(db, k) for k in ("100-7", "100-8")} == before
+    assert db.get_user_total("100-7") == 150
+
+
+def test_recent_rares_use_composite_index(plugin):
+    db = plugin.db
+    with db._write() as c:
+        c.executemany("INSERT INTO history (user_key, name, quality, wear_value, is_special, img_url) VALUES (?, ?, ?, ?, 1, '')",
+                      [("u", f"item{i}", "隐秘", 0.1) for i in range(30)])
+    stats = db.get_user_stats("u")
+    assert [i["name"] for i in stats["items"]] == [f"item{i}" for i in range(29, 19, -1)]
+    with db._read() as c:
+        plan = " ".join(str(r) for r in c.execute(
+            "EXPLAIN QUERY PLAN SELECT name FROM history WHERE user_key=? ORDER BY id DESC LIMIT 10", ("u",)))
+    assert "idx_history_user_id" in plan
+
+
+def test_clear_history_resets_aggregates(make_plugin):
+    plugin = make_plugin({"number": 5})
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    asyncio.run(support.run_command(plugin, f"开箱 50 {case_name}", "7"))
+    plugin.db.clear_user_history("100-7")
+    assert _snapshot(plugin.db, "100-7") == ({}, 0)
+    assert plugin.db.get_user_stats("100-7")["total"] == 0
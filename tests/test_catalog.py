@@ -0,0 +1,68 @@
+import pickle
+import sqlite3
+
+import support
+
+main = support.main
+
+
+def legacy_load_catalog(db_path):
+    # 紧凑目录之前的加载方式：每个物品一个 dict，另建 物品名 -> 图片 的 dict，并在物品 dict 上写入概率
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT name, img_url FROM containers")
+    images_map = {row[0]: row[1] for row in c.fetchall()}
+    case_data = {}
+    c.execute("SELECT container_name, short_name, quality, img_url FROM items ORDER BY id")
+    for c_name, s_name, q, img in c.fetchall():
+        case_data.setdefault(c_name, []).append({"short_name": s_name, "rln": q, "img": img})
+    item_img_map = {}
+    c.execute("SELECT short_name, img_url FROM items WHERE img_url IS NOT NULL ORDER BY id")
+    for row in c.fetchall(): item_img_map[row[0]] = row[1]
+    conn.close()
+
+    plugin = main.CasePlugin.__new__(main.CasePlugin)
+    for case_name, items in case_data.items():
+        prob_table = plugin._get_probability_map([i["rln"] for i in items], case_name)
+        quality_counts = {}
+        for item in items:
+            if item["rln"] in prob_table: quality_counts[item["rln"]] = quality_counts.get(item["rln"], 0) + 1
+        for item in items:
+            q = item["rln"]
+            item["probability"] = prob_table[q] / quality_counts[q] if q in prob_table and quality_counts.get(q) else 0
+    return case_data, images_map, item_img_map
+
+
+def test_catalog_matches_dict_per_item_loader(plugin):
+    case_data, images_map, item_img_map = legacy_load_catalog(main.DB_FILE)
+    assert list(plugin.case_data) == list(case_data)
+    for name, items in case_data.items():
+        views = plugin.case_data[name]
+        assert [{k: v.get(k) for k in ("short_name", "rln", "img", "probability")} for v in views] == items, name
+    assert dict(plugin.item_img_map) == item_img_map
+    assert all(plugin.case_images[n] == images_map[n] for n in images_map)
+
+
+def test_item_views_behave_like_dicts(plugin):
+    name = next(iter(plugin.case_data))
+    item = plugin.case_data[name][0]
+    assert item["short_name"] == item.get("short_name")
+    assert item.get("missing", "x") == "x"
+    try:
+        item["missing"]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("missing key should raise KeyError")
+    assert not hasattr(item, "__dict__")
+    assert "不存在的容器" not in plugin.case_data
+    assert plugin.item_img_map.get("不存在的物品") is None
+
+
+def test_catalog_strings_are_stored_once(plugin):
+    catalog = plugin.catalog
+    assert len(catalog.strings) == len(set(catalog.strings))
+    # 快照往返后内容不变
+    restored = pickle.loads(pickle.dumps(catalog))
+    assert list(restored.case_data) == list(catalog.case_data)
+    assert restored.item_prob == catalog.item_prob
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+
+import pytest
+
+import support
+
+
+def test_connections_use_wal_and_busy_timeout(plugin):
+    db = plugin.db
+    with db._read() as c:
+        assert c.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert c.execute("PRAGMA busy_timeout").fetchone()[0] == int(db.BUSY_TIMEOUT * 1000)
+
+
+def test_concurrent_reads_and_writes_without_lock_errors(plugin):
+    db = plugin.db
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    sampler = plugin.samplers[case_name]
+    errors = []
+
+    def worker(tid):
+        for op in range(40):
+            try:
+                if op % 2:
+                    db.record_open_batch(f"g-{tid % 4}", sampler.draw_batch, 10, "p", 0, "now")
+                else:
+                    db.get_user_stats(f"g-{tid % 4}")
+            except sqlite3.Error as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    assert sum(db.get_user_total(f"g-{i}") for i in range(4)) == 12 * 20 * 10
+
+
+def test_close_releases_connections(tmp_path):
+    plugin = support.make_plugin(str(tmp_path))
+    db = plugin.db
+    with db._read():
+        pass
+    support.close_plugin(plugin)
+    with pytest.raises(sqlite3.ProgrammingError):
+        with db._read():
+            pass
+    assert db._readers.empty()
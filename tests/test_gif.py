@@ -0,0 +1,112 @@
+import asyncio
+import glob
+import hashlib
+import io
+import os
+
+import support
+
+main = support.main
+
+
+def _case(plugin):
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    items = plugin.case_data[case_name]
+    support.seed_images(i.get("img") for i in items)
+    return plugin._generate_item(case_name), items
+
+
+def test_outro_uses_single_derived_thumbnail(plugin):
+    winner, items = _case(plugin)
+    data = asyncio.run(plugin.gif_gen.generate(winner, items))
+    main._load_pil()
+    assert main.Image.open(io.BytesIO(data)).format == "GIF"
+
+    # 中奖物品除滚动条尺寸外只应额外派生一张结尾放大图
+    prefix = hashlib.md5(winner["img"].encode()).hexdigest()
+    derived = glob.glob(os.path.join(main.IMAGES_DIR, f"{prefix}_*"))
+    w, h = plugin.gif_gen._outro_size()
+    assert {os.path.basename(p) for p in derived} <= {
+        f"{prefix}_{w}x{h}_bicubic.png",
+        f"{prefix}_{plugin.gif_gen.BASE_ITEM_SIZE}x{plugin.gif_gen.BASE_ITEM_SIZE}_bicubic.png",
+    }
+    assert os.path.join(main.IMAGES_DIR, f"{prefix}_{w}x{h}_bicubic.png") in derived
+
+
+def test_process_pool_renders_gif(make_plugin):
+    plugin = make_plugin({"render_workers": 1})
+    winner, items = _case(plugin)
+    called = []
+    original = plugin.gif_gen._render_in_pool
+
+    async def spy(*args):
+        data = await original(*args)
+        called.append(len(data))
+        return data
+
+    plugin.gif_gen._render_in_pool = spy
+    data = asyncio.run(plugin.gif_gen.generate(winner, items))
+    # 子进程渲染成功时不会回退到线程渲染
+    assert called == [len(data)]
+    main._load_pil()
+    img = main.Image.open(io.BytesIO(data))
+    assert img.format == "GIF" and img.n_frames > 1
+
+
+def _frames(data):
+    main._load_pil()
+    img = main.Image.open(io.BytesIO(data))
+    durations = []
+    for i in range(img.n_frames):
+        img.seek(i)
+        durations.append(img.info["duration"])
+    return img, durations
+
+
+def test_static_frames_merged_with_same_total_duration(plugin):
+    winner, items = _case(plugin)
+    gen = plugin.gif_gen
+    frame_ms = int(1000 / gen.FPS)
+    scroll_frames = int(gen.FPS * gen.SCROLL_DURATION)
+    for seed in range(3):
+        main.random.seed(seed)
+        _, durations = _frames(asyncio.run(gen.generate(winner, items)))
+        # 原实现输出 滚动 + 结尾 + 20 帧停留 的等长帧，合并后总时长必须不变
+        assert sum(durations) == (scroll_frames + gen.OUTRO_FRAMES + 20) * frame_ms
+        assert len(durations) < scroll_frames + gen.OUTRO_FRAMES
+        assert durations[-1] == 21 * frame_ms
+
+
+def _local_color_tables(data):
+    # 逐块解析 GIF，返回带局部色表的图像块数量
+    def skip_sub_blocks(pos):
+        while data[pos]:
+            pos += data[pos] + 1
+        return pos + 1
+
+    assert data[:6] in (b"GIF87a", b"GIF89a")
+    flags, pos, local = data[10], 13, 0
+    if flags & 0x80:
+        pos += 3 * (2 << (flags & 7))
+    while data[pos] != 0x3B:
+        if data[pos] == 0x21:
+            pos = skip_sub_blocks(pos + 2)
+        elif data[pos] == 0x2C:
+            packed = data[pos + 9]
+            pos += 10
+            if packed & 0x80:
+                local += 1
+                pos += 3 * (2 << (packed & 7))
+            pos = skip_sub_blocks(pos + 1)
+        else:
+            raise AssertionError(f"unexpected block {data[pos]:#x} at {pos}")
+    return local
+
+
+def test_frames_share_one_global_palette(plugin):
+    winner, items = _case(plugin)
+    data = asyncio.run(plugin.gif_gen.generate(winner, items))
+    assert data[10] & 0x80
+    assert _local_color_tables(data) == 0
+    img, _ = _frames(data)
+    assert img.n_frames > 1
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+import main
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_session_timeout_applies_without_explicit_timeout():
+    # 上游不响应时，未传 timeout 的请求也必须在会话默认超时内失败
+    release = asyncio.Event()
+
+    async def hang(request):
+        await release.wait()
+        return web.Response()
+
+    async def go():
+        runner, base = await _serve(hang)
+        client = main.HttpClient(timeout=0.5, max_retries=1)
+        try:
+            t = time.perf_counter()
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.request(f"{base}/api"), 5)
+            return time.perf_counter() - t
+        finally:
+            release.set()
+            await client.close()
+            await runner.cleanup()
+
+    assert asyncio.run(go()) < 2
+
+
+def test_non_retryable_status_is_not_retried():
+    hits = {"n": 0}
+
+    async def handler(request):
+        hits["n"] += 1
+        return web.Response(status=404 if request.path == "/404" else 503)
+
+    async def go():
+        runner, base = await _serve(handler)
+        client = main.HttpClient(backoff_base=0.01)
+        try:
+            for path, expected in (("/404", 1), ("/503", 3)):
+                hits["n"] = 0
+                with pytest.raises(main.aiohttp.ClientResponseError):
+                    await client.request(base + path)
+                assert hits["n"] == expected
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(go())
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import time
+
+import support
+
+main = support.main
+DELAY = 0.2
+
+
+def fake_image_requests(plugin, delay=DELAY):
+    # 以固定延迟返回按 URL 生成的 PNG，记录请求数与最大并发数，代替真实的 CDN 下载
+    stats = {"requests": 0, "active": 0, "max_active": 0}
+
+    async def request(url, **kwargs):
+        stats["requests"] += 1
+        stats["active"] += 1
+        stats["max_active"] = max(stats["max_active"], stats["active"])
+        try:
+            await asyncio.sleep(delay)
+            buf = io.BytesIO()
+            support.fake_png(url).save(buf, format="PNG")
+            return buf.getvalue()
+        finally:
+            stats["active"] -= 1
+
+    plugin.http.request = request
+    return stats
+
+
+def rare_stats(plugin, n=10):
+    urls = list(dict.fromkeys(v for v in plugin.item_img_map.values() if v))[:n]
+    items = [{"name": f"★ 测试物品 {i}", "quality": "隐秘", "wear_value": 0.1, "img_url": url} for i, url in enumerate(urls)]
+    return {"total": len(items), "other_stats": {"隐秘": len(items)}, "items": items}
+
+
+def test_cold_card_fetches_images_concurrently(plugin):
+    stats = fake_image_requests(plugin)
+    data = rare_stats(plugin)
+
+    async def go():
+        t = time.perf_counter()
+        png = await plugin.gif_gen.generate_inventory_card(data, plugin.item_img_map)
+        return png, time.perf_counter() - t
+
+    png, elapsed = asyncio.run(go())
+    main._load_pil()
+    assert main.Image.open(io.BytesIO(png)).format == "PNG"
+    assert stats["requests"] == 10
+    assert stats["max_active"] > 1
+    # 逐张下载至少需要 10 × DELAY
+    assert elapsed < 10 * DELAY / 2
+
+
+def test_warm_card_makes_no_requests(plugin):
+    stats = fake_image_requests(plugin)
+    data = rare_stats(plugin)
+    asyncio.run(plugin.gif_gen.generate_inventory_card(data, plugin.item_img_map))
+    stats["requests"] = 0
+    asyncio.run(plugin.gif_gen.generate_inventory_card(data, plugin.item_img_map))
+    assert stats["requests"] == 0
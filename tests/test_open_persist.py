@@ -0,0 +1,65 @@
+import asyncio
+
+import support
+
+
+OPEN_TABLES = ("open_limit_state", "user_stats", "history", "user_rare_stats", "user_totals")
+
+
+def _commit_counter(plugin):
+    # 只统计写入开箱相关表的事务，后台任务（如磁盘缓存索引）的提交不计入
+    statements = []
+    plugin.db._writer.set_trace_callback(statements.append)
+
+    def count():
+        commits, touched = 0, False
+        for sql in statements:
+            upper = sql.strip().upper()
+            if upper == "COMMIT":
+                commits += touched
+                touched = False
+            elif upper.startswith(("INSERT", "UPDATE", "DELETE")) and any(t in sql for t in OPEN_TABLES):
+                touched = True
+        return commits
+    return count
+
+
+def _row(db, sql, *args):
+    with db._read() as c:
+        c.execute(sql, args)
+        return c.fetchone()
+
+
+def test_open_request_commits_once(make_plugin):
+    plugin = make_plugin({"number": 5})
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    commits = _commit_counter(plugin)
+    asyncio.run(support.run_command(plugin, f"开箱 50 {case_name}", "7"))
+    assert commits() == 1
+
+
+def test_aggregates_match_recorded_rows(make_plugin):
+    plugin = make_plugin({"number": 5})
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    for _ in range(4):
+        asyncio.run(support.run_command(plugin, f"开箱 50 {case_name}", "7"))
+    db, key = plugin.db, "100-7"
+    total = _row(db, "SELECT total FROM user_totals WHERE user_key=?", key)[0]
+    common = _row(db, "SELECT COALESCE(SUM(count), 0) FROM user_stats WHERE user_key=?", key)[0]
+    rare = _row(db, "SELECT COALESCE(SUM(count), 0) FROM user_rare_stats WHERE user_key=?", key)[0]
+    history = _row(db, "SELECT count(*) FROM history WHERE user_key=?", key)[0]
+    assert total == 200 == common + rare
+    assert rare == history
+
+
+def test_draws_stop_at_daily_quota(make_plugin, monkeypatch):
+    plugin = make_plugin({"max_open_per_day": 60, "number": 5})
+    case_name = next(n for n in sorted(plugin.case_data) if plugin.samplers.get(n))
+    drawn = []
+    original = support.main.CaseSampler.draw_batch
+    monkeypatch.setattr(support.main.CaseSampler, "draw_batch", lambda self, n: drawn.append(n) or original(self, n))
+
+    results = [asyncio.run(support.run_command(plugin, f"开箱 50 {case_name}", "7")) for _ in range(3)]
+    assert drawn == [50, 10]
+    assert "已达上限" in results[2][0][1]
+    assert _row(plugin.db, "SELECT total FROM user_totals WHERE user_key=?", "100-7")[0] == 60
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import support
+
+main = support.main
+
+
+def _keys(db):
+    with db._read() as c:
+        c.execute("SELECT kind, key FROM price_cache ORDER BY kind, key")
+        return c.fetchall()
+
+
+def test_expired_rows_pruned_on_write(make_plugin):
+    plugin = make_plugin({"price_cache_ttl": 600, "price_rate": 100})
+    db, now = plugin.db, time.time()
+    # 搜索结果缓存 6 倍 TTL：半小时前的搜索仍有效，2 小时前的两类记录都已过期
+    db.put_price_cache("search", "fresh", [1], now - 1800)
+    db.put_price_cache("search", "stale", [1], now - 7200)
+    db.put_price_cache("goods", "stale", {"p": 1}, now - 7200)
+
+    async def fetch():
+        return {"p": 2}
+
+    asyncio.run(plugin.price_cache.get("goods", "new", plugin.price_ttl, fetch))
+    assert _keys(db) == [("goods", "new"), ("search", "fresh")]
+
+    # 清理有最小间隔，紧接着的写入不会再次执行 DELETE
+    db.put_price_cache("goods", "stale", {"p": 1}, now - 7200)
+    asyncio.run(plugin.price_cache.get("goods", "other", plugin.price_ttl, fetch))
+    assert ("goods", "stale") in _keys(db)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import support
+
+main = support.main
+
+
+def _start(path, monkeypatch=None):
+    rebuilt = []
+    if monkeypatch is not None:
+        original = main.DatabaseManager.load_all_data
+        monkeypatch.setattr(main.DatabaseManager, "load_all_data", lambda self: rebuilt.append(1) or original(self))
+    plugin = support.make_plugin(str(path))
+    return plugin, rebuilt
+
+
+def test_fonts_load_once_under_concurrency(monkeypatch):
+    calls = []
+
+    def slow_find():
+        calls.append(1)
+        time.sleep(0.05)
+        return None
+
+    monkeypatch.setattr(main, "_find_font_path", slow_find)
+    gen = main.GifGenerator(None)
+    threads = [threading.Thread(target=gen._ensure_fonts) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(calls) == 1
+    assert gen.font_bold is not None
+
+
+def test_warm_start_reads_catalog_snapshot(tmp_path, monkeypatch):
+    plugin, _ = _start(tmp_path)
+    names = list(plugin.case_data)
+    support.close_plugin(plugin)
+    assert os.path.exists(main.CATALOG_SNAPSHOT_FILE)
+
+    plugin, rebuilt = _start(tmp_path, monkeypatch)
+    try:
+        assert rebuilt == []
+        assert list(plugin.case_data) == names
+        assert all(plugin.samplers.get(n) is not None for n in names if plugin.case_data[n])
+    finally:
+        support.close_plugin(plugin)
+
+
+def test_snapshot_invalidated_when_catalog_content_changes(tmp_path, monkeypatch):
+    plugin, _ = _start(tmp_path)
+    name = next(iter(plugin.case_data))
+    support.close_plugin(plugin)
+
+    # 直接改写数据库文件（不经过“更新武器箱”，catalog_version 不变），快照也必须失效
+    conn = sqlite3.connect(main.DB_FILE)
+    conn.execute("UPDATE containers SET img_url = 'https://example.invalid/new.png' WHERE name = ?", (name,))
+    conn.commit()
+    conn.close()
+
+    plugin, rebuilt = _start(tmp_path, monkeypatch)
+    try:
+        assert rebuilt == [1]
+        assert plugin.case_images[name] == "https://example.invalid/new.png"
+    finally:
+        support.close_plugin(plugin)
+
+
+def test_snapshot_invalidated_when_database_replaced(tmp_path, monkeypatch):
+    plugin, _ = _start(tmp_path)
+    name = next(iter(plugin.case_data))
+    support.close_plugin(plugin)
+
+    # 换成删除了一个容器的数据库副本
+    replacement = os.path.join(str(tmp_path), "replacement.db")
+    shutil.copy(support.SHIPPED_DB, replacement)
+    conn = sqlite3.connect(replacement)
+    conn.execute("DELETE FROM items WHERE container_name = ?", (name,))
+    conn.execute("DELETE FROM containers WHERE name = ?", (name,))
+    conn.commit()
+    conn.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(main.DB_FILE + suffix): os.remove(main.DB_FILE + suffix)
+    shutil.move(replacement, main.DB_FILE)
+
+    plugin, rebuilt = _start(tmp_path, monkeypatch)
+    try:
+        assert rebuilt == [1]
+        assert name not in plugin.case_data
+    finally:
+        support.close_plugin(plugin)